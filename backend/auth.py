@@ -1,13 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from database import get_db
-from models import User
-from schemas import TokenData
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from database import get_async_db
+from models import User, UserRole
+from schemas import TokenData, UserResponse
+from cache import cache
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -17,12 +22,22 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Embed user id, role and active flag in tokens so authorization can skip the DB
+JWT_EMBED_CLAIMS = os.getenv("JWT_EMBED_CLAIMS", "false").lower() == "true"
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are upgraded transparently on login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # JWT token scheme
 security = HTTPBearer()
+# Same scheme for endpoints that also serve anonymous visitors
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -32,6 +47,52 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so it never blocks the event loop.
+    
+    Once every worker is busy and the queue is full, further calls are
+    rejected with 429 instead of piling up behind a login burst.
+    """
+    
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        # Started on first use, so the app can start again after a shutdown
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.max_pending = workers + queue_size
+        self.pending = 0
+    
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE)
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the password hashing pool."""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the hashing pool, returning a new hash if the cost changed."""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -44,6 +105,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_claims(user: User) -> dict:
+    """Claims identifying ``user`` in an access token."""
+    claims = {"sub": user.username}
+    if JWT_EMBED_CLAIMS:
+        claims.update({
+            "uid": user.id,
+            "role": user.role.value if isinstance(user.role, UserRole) else user.role,
+            "active": user.is_active,
+        })
+    return claims
+
 def verify_token(token: str, credentials_exception):
     """Verify and decode a JWT token."""
     try:
@@ -51,14 +123,48 @@ def verify_token(token: str, credentials_exception):
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+        token_data = TokenData(
+            username=username,
+            user_id=payload.get("uid"),
+            role=payload.get("role"),
+            is_active=payload.get("active")
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
     return token_data
 
-def get_current_user(
+def _user_cache_key(username: str) -> str:
+    return f"auth:user:{username}"
+
+async def invalidate_user(username: str):
+    """Drop a user's cached principal after their record changes."""
+    await cache.delete(_user_cache_key(username))
+
+async def load_user(db: AsyncSession, username: str) -> Optional[User]:
+    """Load a user by username, going through the short-lived principal cache.
+    
+    Cached users are detached from any session; load the row explicitly
+    before modifying it.
+    """
+    cache_key = _user_cache_key(username)
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        user = User(**UserResponse.model_validate(cached).model_dump())
+        make_transient_to_detached(user)
+        return user
+    
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is not None:
+        await cache.set(
+            cache_key,
+            UserResponse.model_validate(user).model_dump(mode="json"),
+            USER_CACHE_TTL
+        )
+    return user
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get the current authenticated user."""
     credentials_exception = HTTPException(
@@ -70,18 +176,64 @@ def get_current_user(
     token = credentials.credentials
     token_data = verify_token(token, credentials_exception)
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = await load_user(db, token_data.username)
     if user is None:
         raise credentials_exception
     
     return user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_token_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get the current user from token claims when present, else like get_current_user.
+    
+    A claims-only user carries just id, username, role and active flag, and
+    role or status changes only take effect once the token is reissued.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    token_data = verify_token(credentials.credentials, credentials_exception)
+    if None in (token_data.user_id, token_data.role, token_data.is_active):
+        user = await load_user(db, token_data.username)
+        if user is None:
+            raise credentials_exception
+        return user
+    
+    user = User(
+        id=token_data.user_id,
+        username=token_data.username,
+        role=token_data.role,
+        is_active=token_data.is_active
+    )
+    make_transient_to_detached(user)
+    return user
+
+def get_current_active_user(current_user: User = Depends(get_token_user)) -> User:
     """Get the current active user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_optional_active_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """Get the current active user, or None when the request carries no token."""
+    if credentials is None:
+        return None
+    return get_current_active_user(await get_token_user(credentials, db))
+
+def get_current_active_profile(current_user: User = Depends(get_current_user)) -> User:
+    """Get the current active user's full record, never just token claims."""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
 def get_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
     """Get the current user and verify they are an admin."""
     if current_user.role != "admin":
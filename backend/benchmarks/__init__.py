@@ -0,0 +1,5 @@
+"""Benchmarks and load scenarios; run each from backend/ as ``python -m benchmarks.<name>``.
+
+None of them run with the tests. The module docstrings say what each one
+measures and what it needs (a database, a running server) to do it.
+"""
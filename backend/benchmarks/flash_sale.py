@@ -0,0 +1,97 @@
+"""Flash sale load scenario: many buyers, one product, little stock.
+
+Creates a product with ``--stock`` units and ``--buyers`` users in the
+server's database, then has every buyer add one unit to their cart and
+check out at the same moment. Tokens are minted here, so run it from
+backend/ with the same .env (DATABASE_URL, JWT_SECRET_KEY) as the server,
+and start the server with PAYMENT_GATEWAY=fake::
+    
+    python -m benchmarks.flash_sale http://localhost:8000 --buyers 1000 --stock 100
+
+Reports the purchases' latency and outcomes (200 bought; 400 sold out;
+409 lost a checkout race), then checks the product was not oversold:
+units sold plus stock left must equal the stock it started with. Run it
+on PostgreSQL: SQLite serializes writers, so most buyers fail with
+"database is locked" there.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import func, select
+
+from auth import create_access_token, get_password_hash, token_claims
+from benchmarks.load import make_client, run_load
+from database import SessionLocal
+from models import Category, Order, OrderItem, Product, StockReservation, User
+
+ADDRESS = "1 Benchmark Street"
+
+def seed(buyers: int, stock: int):
+    """A product with ``stock`` units and a bearer token for each of ``buyers`` new users."""
+    run = int(time.time())
+    hashed_password = get_password_hash(f"flash-sale-{run}")
+    with SessionLocal() as db:
+        product = Product(
+            name=f"Flash sale {run}", price=9.99, stock_quantity=stock,
+            category=Category(name=f"Flash sale {run}")
+        )
+        users = [
+            User(
+                email=f"flash-{run}-{i}@example.com", username=f"flash-{run}-{i}",
+                hashed_password=hashed_password, first_name="Flash", last_name=f"Buyer {i}"
+            )
+            for i in range(buyers)
+        ]
+        db.add(product)
+        db.add_all(users)
+        db.commit()
+        tokens = [create_access_token(token_claims(user)) for user in users]
+        return product.id, tokens
+
+def check_stock(product_id: int, stock: int) -> bool:
+    """Print what was sold and return whether it adds up to the starting stock."""
+    with SessionLocal() as db:
+        product = db.get(Product, product_id)
+        sold = db.scalar(
+            select(func.coalesce(func.sum(OrderItem.quantity), 0))
+            .join(Order, OrderItem.order_id == Order.id)
+            .where(OrderItem.product_id == product_id)
+        )
+        held = db.scalar(
+            select(func.coalesce(func.sum(StockReservation.quantity), 0))
+            .where(StockReservation.product_id == product_id)
+        )
+        print(f"Sold {sold} of {stock}; {product.stock_quantity} left, {held} still held")
+        return sold <= stock and sold + product.stock_quantity == stock
+
+async def sell(base_url: str, product_id: int, tokens):
+    async def buy(client, number):
+        headers = {"Authorization": f"Bearer {tokens[number]}"}
+        response = await client.post("/api/cart/add", json={"product_id": product_id, "quantity": 1}, headers=headers)
+        if response.status_code != 200:
+            return response
+        return await client.post(
+            "/api/orders/",
+            json={"shipping_address": ADDRESS, "billing_address": ADDRESS, "order_items": []},
+            headers=headers
+        )
+    
+    # Every buyer at once: one client each
+    async with make_client(base_url, len(tokens), timeout=120) as client:
+        return await run_load(client, len(tokens), len(tokens), buy)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a flash sale of one product against a running server.")
+    parser.add_argument("url", help="Base URL of the server")
+    parser.add_argument("--buyers", type=int, default=1000, help="Concurrent buyers")
+    parser.add_argument("--stock", type=int, default=100, help="Units on sale")
+    args = parser.parse_args()
+    
+    product_id, tokens = seed(args.buyers, args.stock)
+    result = asyncio.run(sell(args.url, product_id, tokens))
+    print(f"Purchases: {result.summary()}")
+    if not check_stock(product_id, args.stock):
+        print("Stock does not add up: the product was oversold or lost units")
+        sys.exit(1)
@@ -0,0 +1,55 @@
+"""Per-request overhead of InstrumentationMiddleware.
+
+Times a bare ASGI endpoint with and without the middleware in front of it
+and exits non-zero above the 50µs budget, so it can gate CI.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from middleware import InstrumentationMiddleware
+
+BUDGET_SECONDS = 50e-6
+
+def benchmark_overhead(requests: int = 20000) -> float:
+    """Seconds the middleware adds to a request, measured around a bare ASGI app."""
+    
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        pass
+    
+    scope = {"type": "http", "method": "GET", "path": "/bench", "headers": [], "client": ("127.0.0.1", 1), "endpoint": endpoint}
+    # Never sample, so the figure excludes logging, which is rare by design
+    instrumented = InstrumentationMiddleware(endpoint, sample_rate=0, slow_seconds=float("inf"))
+    
+    async def run(app) -> float:
+        start = time.perf_counter()
+        for _ in range(requests):
+            await app(dict(scope), receive, send)
+        return time.perf_counter() - start
+    
+    async def measure() -> float:
+        await run(endpoint)
+        await run(instrumented)  # Warm up
+        overheads = []
+        for _ in range(5):
+            overheads.append((await run(instrumented) - await run(endpoint)) / requests)
+        return min(overheads)
+    
+    return asyncio.run(measure())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the instrumentation middleware's overhead per request.")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per timed run")
+    args = parser.parse_args()
+    
+    overhead = benchmark_overhead(args.requests)
+    print(f"Instrumentation overhead: {overhead * 1e6:.1f}us per request (budget {BUDGET_SECONDS * 1e6:.0f}us)")
+    sys.exit(0 if overhead < BUDGET_SECONDS else 1)
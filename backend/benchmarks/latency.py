@@ -0,0 +1,37 @@
+"""Latency percentiles of catalog reads under concurrent load.
+
+Targets running servers, so "before" and "after" are two checkouts of the
+store: for example the tree before the async database layer, started with
+``uvicorn main:app --port 8001``, and this one on port 8000, both on the
+same database::
+
+    python -m benchmarks.latency before=http://localhost:8001 after=http://localhost:8000
+
+Each target gets the same closed-loop load (200 clients by default) and
+the p50/p95/p99 latencies are reported side by side.
+"""
+import argparse
+import asyncio
+
+from benchmarks.load import make_client, run_load
+
+DEFAULT_PATHS = ["/api/products/?limit=20", "/api/products/categories/", "/health/db"]
+
+async def measure(base_url: str, paths, clients: int, requests: int):
+    async with make_client(base_url, clients) as client:
+        # Warm up connections and caches so both targets start alike
+        await run_load(client, clients, clients, lambda client, number: client.get(paths[number % len(paths)]))
+        return await run_load(client, clients, requests, lambda client, number: client.get(paths[number % len(paths)]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare request latency percentiles of running servers.")
+    parser.add_argument("targets", nargs="+", help="Base URLs to load, optionally labelled as label=url")
+    parser.add_argument("--path", action="append", dest="paths", help="Path to request, repeatable (default: a catalog mix)")
+    parser.add_argument("--clients", type=int, default=200, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per target")
+    args = parser.parse_args()
+    
+    for target in args.targets:
+        label, _, base_url = target.rpartition("=")
+        result = asyncio.run(measure(base_url, args.paths or DEFAULT_PATHS, args.clients, args.requests))
+        print(f"{label or base_url}: {result.summary()}")
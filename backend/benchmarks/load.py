@@ -0,0 +1,73 @@
+"""Closed-loop HTTP load shared by the load benchmarks.
+
+A fixed number of clients each send their next request as soon as the last
+one is answered, which is how a burst of real users behaves.
+"""
+from collections import Counter
+from typing import Awaitable, Callable, List
+import asyncio
+import time
+
+import httpx
+
+class LoadResult:
+    """Latencies and outcomes of one load run."""
+    
+    def __init__(self, latencies: List[float], outcomes: Counter, elapsed: float):
+        self.latencies = sorted(latencies)
+        self.outcomes = outcomes
+        self.elapsed = elapsed
+    
+    def percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(len(self.latencies) * percent / 100))
+        return self.latencies[index]
+    
+    def summary(self) -> str:
+        outcomes = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes.items(), key=str))
+        return (
+            f"{len(self.latencies) / self.elapsed:.0f} req/s, "
+            f"p50 {self.percentile(50) * 1e3:.1f}ms, p95 {self.percentile(95) * 1e3:.1f}ms, "
+            f"p99 {self.percentile(99) * 1e3:.1f}ms ({outcomes})"
+        )
+
+def make_client(base_url: str, clients: int, timeout: float = 30) -> httpx.AsyncClient:
+    """An HTTP client with a connection for every simulated client."""
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    )
+
+async def run_load(
+    client: httpx.AsyncClient,
+    clients: int,
+    requests: int,
+    send: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+) -> LoadResult:
+    """Send ``requests`` requests from ``clients`` concurrent clients.
+    
+    ``send`` gets the request's number and returns the response; outcomes
+    are counted by status code, or by exception name for transport errors.
+    """
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    sent = 0
+    
+    async def run_client():
+        nonlocal sent
+        while sent < requests:
+            number = sent
+            sent += 1
+            start = time.perf_counter()
+            try:
+                response = await send(client, number)
+                outcomes[response.status_code] += 1
+            except httpx.HTTPError as e:
+                outcomes[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[run_client() for _ in range(clients)])
+    return LoadResult(latencies, outcomes, time.perf_counter() - start)
@@ -0,0 +1,67 @@
+"""Login throughput of a running server under a burst of concurrent logins.
+
+Registers a benchmark user (or reuses it), then sends ``--requests`` logins
+from ``--clients`` concurrent clients. Alongside the burst, a probe requests
+/health once every 50ms: with bcrypt on the worker pool its latency stays
+flat, while bcrypt on the event loop stalls it. Logins refused with 429
+are the pool's back-pressure (PASSWORD_HASH_QUEUE_SIZE)::
+
+    python -m benchmarks.login http://localhost:8000 --clients 100
+"""
+from collections import Counter
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.load import LoadResult, make_client, run_load
+
+USERNAME = "login-benchmark"
+PASSWORD = "login-benchmark-password"
+
+async def register(client: httpx.AsyncClient):
+    response = await client.post("/api/auth/register", json={
+        "email": f"{USERNAME}@example.com",
+        "username": USERNAME,
+        "password": PASSWORD,
+        "first_name": "Login",
+        "last_name": "Benchmark",
+    })
+    # 400: registered by an earlier run
+    if response.status_code not in (200, 400):
+        response.raise_for_status()
+
+async def probe(client: httpx.AsyncClient, done: asyncio.Event) -> LoadResult:
+    """Latency of /health, sampled every 50ms until ``done`` is set."""
+    latencies = []
+    start = time.perf_counter()
+    while not done.is_set():
+        sent = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - sent)
+        await asyncio.sleep(0.05)
+    return LoadResult(latencies, Counter(), time.perf_counter() - start)
+
+async def measure(base_url: str, clients: int, requests: int):
+    async with make_client(base_url, clients + 1) as client:
+        await register(client)
+        done = asyncio.Event()
+        probing = asyncio.create_task(probe(client, done))
+        logins = await run_load(
+            client, clients, requests,
+            lambda client, number: client.post("/api/auth/login", data={"username": USERNAME, "password": PASSWORD})
+        )
+        done.set()
+        return logins, await probing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure login throughput of a running server.")
+    parser.add_argument("url", help="Base URL of the server")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="Logins to send")
+    args = parser.parse_args()
+    
+    logins, health = asyncio.run(measure(args.url, args.clients, args.requests))
+    print(f"Logins: {logins.summary()}")
+    print(f"/health during the burst: p50 {health.percentile(50) * 1e3:.1f}ms, p99 {health.percentile(99) * 1e3:.1f}ms")
@@ -0,0 +1,133 @@
+"""Product search on a large catalog (1M products by default).
+
+Without ``--database`` it builds the in-memory fallback index over
+generated products and times prefix queries against it; no database is
+needed. With ``--database`` it adds generated products to DATABASE_URL
+(in a "Search benchmark" category, reused on later runs) and times each
+query the old way, leading-wildcard ILIKE on name and description, and
+through apply_search: the tsvector GIN index on PostgreSQL, the fallback
+index elsewhere. Use a scratch, migrated database; seeding 1M rows takes a
+while.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, Iterator, List
+
+from sqlalchemy import func, insert, or_, select
+
+from database import AsyncSessionLocal, SessionLocal, engine
+from models import Category, Product
+from search import InvertedIndex, apply_search
+
+ADJECTIVES = ["classic", "compact", "deluxe", "durable", "ergonomic", "lightweight", "portable", "premium", "rugged", "vintage", "wireless", "waterproof"]
+MATERIALS = ["bamboo", "canvas", "ceramic", "cotton", "glass", "leather", "linen", "oak", "steel", "walnut", "wool", "titanium"]
+NOUNS = ["backpack", "blender", "bottle", "chair", "desk", "headphones", "jacket", "kettle", "keyboard", "lamp", "mug", "speaker", "tent", "watch"]
+FILLER = ["with", "for", "everyday", "use", "and", "a", "finish", "designed", "to", "last", "travel", "home", "office", "gift"]
+QUERIES = ["wireless headphones", "leather", "oak desk", "port", "vint lea back", "titanium watch", "waterproof tent", "zzz"]
+BENCHMARK_CATEGORY = "Search benchmark"
+
+def generate_products(count: int, seed: int = 42) -> Iterator[Dict]:
+    """Deterministic product rows with varied names and descriptions."""
+    rng = random.Random(seed)
+    for i in range(count):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)} {i}".title()
+        words = rng.choices(ADJECTIVES + MATERIALS + NOUNS + FILLER * 3, k=12)
+        yield {"name": name, "description": " ".join(words).capitalize() + ".", "price": round(rng.uniform(5, 500), 2)}
+
+def _timings(run, rounds: int) -> List[float]:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+def _report(label: str, timings: List[float], matches: int):
+    median = timings[len(timings) // 2]
+    print(f"  {label:<8} median {median * 1e3:8.2f}ms, worst {timings[-1] * 1e3:8.2f}ms, {matches} matches")
+
+def benchmark_index(products: int, rounds: int):
+    """Build the fallback index over ``products`` generated products and query it."""
+    start = time.perf_counter()
+    index = InvertedIndex()
+    for product_id, row in enumerate(generate_products(products), start=1):
+        index.add(product_id, row["name"], row["description"])
+    index.finalize()
+    print(f"Indexed {products} products in {time.perf_counter() - start:.1f}s, {len(index.vocabulary)} terms")
+    
+    for term in QUERIES:
+        print(f"{term!r}")
+        _report("index", _timings(lambda: index.search(term), rounds), len(index.search(term)))
+
+def seed_catalog(products: int, batch: int = 10000):
+    """Make sure the benchmark category holds ``products`` products."""
+    with SessionLocal() as db:
+        category = db.scalar(select(Category).where(Category.name == BENCHMARK_CATEGORY))
+        if category is None:
+            category = Category(name=BENCHMARK_CATEGORY)
+            db.add(category)
+            db.commit()
+        existing = db.scalar(select(func.count()).select_from(Product).where(Product.category_id == category.id))
+        category_id = category.id
+    
+    missing = products - existing
+    if missing <= 0:
+        return
+    print(f"Seeding {missing} products...")
+    rows = []
+    with engine.begin() as conn:
+        for row in generate_products(missing, seed=existing):
+            rows.append({**row, "stock_quantity": 10, "is_active": True, "category_id": category_id})
+            if len(rows) == batch:
+                conn.execute(insert(Product), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Product), rows)
+
+async def benchmark_database(products: int, rounds: int, limit: int = 20):
+    """Time ILIKE against apply_search on the configured database."""
+    seed_catalog(products)
+    base = select(Product.id).where(Product.is_active == True)
+    
+    async with AsyncSessionLocal() as db:
+        print(f"Searching {await db.scalar(select(func.count()).select_from(Product))} products on {db.bind.dialect.name}")
+        
+        async def timed(make_query) -> List[float]:
+            timings = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                (await db.scalars((await make_query()).limit(limit))).all()
+                timings.append(time.perf_counter() - start)
+            return sorted(timings)
+        
+        async def ilike(term):
+            pattern = f"%{term}%"
+            return base.where(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+        
+        # The first search builds the fallback index where there is one
+        start = time.perf_counter()
+        await apply_search(db, base, QUERIES[0])
+        print(f"First search (index build on non-PostgreSQL databases): {time.perf_counter() - start:.1f}s")
+        
+        for term in QUERIES:
+            print(f"{term!r}")
+            before = await timed(lambda: ilike(term))
+            matches = len((await db.scalars(await ilike(term))).all())
+            _report("ILIKE", before, matches)
+            after = await timed(lambda: apply_search(db, base, term))
+            matches = len((await db.scalars(await apply_search(db, base, term))).all())
+            _report("search", after, matches)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark product search on a large generated catalog.")
+    parser.add_argument("--products", type=int, default=1_000_000, help="Catalog size")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--database", action="store_true", help="Seed and query DATABASE_URL instead of an in-memory index")
+    args = parser.parse_args()
+    
+    if args.database:
+        asyncio.run(benchmark_database(args.products, args.rounds))
+    else:
+        benchmark_index(args.products, args.rounds)
@@ -0,0 +1,65 @@
+"""Serializing a page of products with nested categories, before and after typed pages.
+
+Before: dict items re-validated through an untyped PaginatedResponse
+response_model and encoded with the stdlib json. After: a typed
+PaginatedResponse[ProductResponse] serialized once by model_response.
+Needs no database; the products are built in memory.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models import Category, Product
+from responses import model_response
+from schemas import PaginatedResponse, ProductResponse
+
+def benchmark_serialization(products: int = 100, rounds: int = 200):
+    """Seconds per page of ``products`` products, (before, after), from ORM objects to JSON bytes."""
+    now = datetime.now(timezone.utc)
+    category = Category(id=1, name="Category", description="A category", is_active=True, created_at=now)
+    page = [
+        Product(
+            id=i, name=f"Product {i}", description="A product description", price=9.99 + i,
+            image_url=f"https://example.com/{i}.jpg", stock_quantity=10, category_id=1, category=category,
+            is_active=True, created_at=now, reviews_count=3, rating_average=4.3,
+            **{f"rating_{stars}_count": 0 for stars in range(1, 6)}
+        )
+        for i in range(products)
+    ]
+    untyped_field = create_response_field(name="Response_get_products", type_=PaginatedResponse)
+    
+    async def before() -> bytes:
+        content = PaginatedResponse(
+            items=[ProductResponse.model_validate(product).model_dump(mode="json") for product in page],
+            limit=products
+        )
+        return JSONResponse(await serialize_response(field=untyped_field, response_content=content)).body
+    
+    async def after() -> bytes:
+        return model_response(PaginatedResponse[ProductResponse](
+            items=[ProductResponse.model_validate(product) for product in page],
+            limit=products
+        )).body
+    
+    async def measure(render) -> float:
+        await render()  # Warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await render()
+        return (time.perf_counter() - start) / rounds
+    
+    return asyncio.run(measure(before)), asyncio.run(measure(after))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time serializing a page of products both ways.")
+    parser.add_argument("--products", type=int, default=100, help="Products per page")
+    parser.add_argument("--rounds", type=int, default=200, help="Pages serialized per timing")
+    args = parser.parse_args()
+    
+    before, after = benchmark_serialization(args.products, args.rounds)
+    print(f"{args.products} products: {before * 1e3:.2f}ms before, {after * 1e3:.2f}ms after ({before / after:.1f}x)")
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import secrets
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration
+# CACHE_URL selects the backend: empty for the in-process LRU, redis://... for
+# a shared Redis-compatible server, or fakeredis:// for tests.
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+
+class CacheStats:
+    """Hit, miss and eviction counters for a cache backend."""
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "deletes": self.deletes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL.
+    
+    Values are stored as-is, so callers must not mutate what they get back.
+    Counters live outside the LRU so a version number is never evicted, but
+    they restart from zero with the process; ``counter_epoch`` tells their
+    lifetimes apart.
+    """
+    
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, default_ttl: int = CACHE_DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self.counter_epoch = secrets.token_hex(8)
+        self.stats = CacheStats()
+    
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        self.stats.sets += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+    
+    async def delete(self, *keys: str):
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.stats.deletes += 1
+    
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+    
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+    
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self.stats.as_dict(),
+        }
+
+class RedisCache:
+    """Cache backed by a Redis-compatible server, storing values as JSON."""
+    
+    def __init__(self, client, default_ttl: int = CACHE_DEFAULT_TTL):
+        self.client = client
+        self.default_ttl = default_ttl
+        # Counters are shared by every worker and outlive restarts
+        self.counter_epoch = ""
+        self.stats = CacheStats()
+    
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        await self.client.set(key, json.dumps(value), ex=ttl or None)
+        self.stats.sets += 1
+    
+    async def delete(self, *keys: str):
+        if keys:
+            self.stats.deletes += await self.client.delete(*keys)
+    
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+    
+    async def get_counter(self, key: str) -> int:
+        return int(await self.client.get(key) or 0)
+    
+    def info(self) -> Dict[str, Any]:
+        # Evictions and expirations happen server-side; see Redis INFO stats.
+        return {"backend": "redis", **self.stats.as_dict()}
+
+def create_cache(url: str = CACHE_URL):
+    """Create the cache backend selected by ``url``."""
+    if url.startswith("fakeredis://"):
+        from fakeredis import aioredis as fakeredis
+        
+        return RedisCache(fakeredis.FakeRedis())
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed")
+        
+        return RedisCache(aioredis.from_url(url))
+    return MemoryCache()
+
+cache = create_cache()
@@ -0,0 +1,122 @@
+from typing import Any, Dict, List
+import os
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import cache
+from database import upsert
+from models import CartItem, Product
+from inventory import available_stock, hold_stock
+from schemas import CartSummary
+
+load_dotenv()
+
+# Summaries include stock availability, which other carts change, so they are
+# only cached briefly on top of being invalidated by this cart's own writes.
+CART_SUMMARY_TTL = int(os.getenv("CART_SUMMARY_TTL", "30"))
+
+async def upsert_cart_items(db: AsyncSession, user_id: int, quantities: Dict[int, int], replace: bool = False) -> Dict[int, int]:
+    """Add ``quantities`` to the user's cart (or set them, with ``replace``).
+    
+    Every product is written by one INSERT ... ON CONFLICT (user_id, product_id)
+    DO UPDATE that only selects active products, and stock for the resulting
+    quantities is then held with hold_stock. Returns the new quantity
+    per product. Does not commit; raises HTTPException (after rolling back) if
+    a product is missing, inactive or short of stock.
+    """
+    if not quantities:
+        return {}
+    if any(quantity < 1 for quantity in quantities.values()):
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    
+    stmt = upsert(db, CartItem).from_select(
+        ["user_id", "product_id", "quantity"],
+        select(literal(user_id), Product.id, case(quantities, value=Product.id))
+        .where(and_(Product.id.in_(list(quantities)), Product.is_active == True))
+    )
+    quantity = stmt.excluded.quantity if replace else CartItem.quantity + stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={"quantity": quantity, "updated_at": func.now()}
+    ).returning(CartItem.product_id, CartItem.quantity)
+    totals = dict((await db.execute(stmt)).all())
+    
+    if len(totals) != len(quantities):
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    await hold_stock(db, user_id, totals)
+    return totals
+
+def _summary_key(user_id: int) -> str:
+    return f"cart:summary:{user_id}"
+
+async def cart_changed(user_id: int):
+    """Drop the user's cached cart summary; call after every cart write."""
+    await cache.delete(_summary_key(user_id))
+
+def build_summary(lines: List[Dict[str, Any]], item_count: int, quantity_total: int, subtotal: float) -> Dict[str, Any]:
+    """Assemble a CartSummary payload from per-line rows and cart totals."""
+    for line in lines:
+        line["line_total"] = round(line["price"] * line["quantity"], 2)
+        line["in_stock"] = line["quantity"] <= line["available"]
+    return CartSummary(
+        item_count=item_count,
+        quantity_total=quantity_total,
+        subtotal=round(subtotal, 2),
+        lines=lines
+    ).model_dump(mode="json")
+
+async def cart_summary(db: AsyncSession, user_id: int) -> Dict[str, Any]:
+    """Totals and per-line availability for a user's cart, from one query.
+    
+    Cart totals are window aggregates over the same joined rows as the lines,
+    so the database does the summing in a single round trip.
+    """
+    cache_key = _summary_key(user_id)
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    rows = (await db.execute(
+        select(
+            CartItem.id,
+            CartItem.product_id,
+            Product.name,
+            Product.price,
+            CartItem.quantity,
+            case(
+                (Product.is_active == True, available_stock(user_id)),
+                else_=0
+            ).label("available"),
+            func.count().over().label("item_count"),
+            func.sum(CartItem.quantity).over().label("quantity_total"),
+            func.sum(CartItem.quantity * Product.price).over().label("subtotal")
+        )
+        .join(Product, CartItem.product_id == Product.id)
+        .where(CartItem.user_id == user_id)
+        .order_by(CartItem.id)
+    )).all()
+    
+    lines = [
+        {
+            "item_id": row.id,
+            "product_id": row.product_id,
+            "name": row.name,
+            "price": row.price,
+            "quantity": row.quantity,
+            "available": max(row.available, 0),
+        }
+        for row in rows
+    ]
+    first = rows[0] if rows else None
+    summary = build_summary(
+        lines,
+        first.item_count if first else 0,
+        first.quantity_total if first else 0,
+        first.subtotal if first else 0.0
+    )
+    await cache.set(cache_key, summary, CART_SUMMARY_TTL)
+    return summary
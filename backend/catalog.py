@@ -0,0 +1,80 @@
+from typing import Any, Dict
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+
+from cache import cache
+
+load_dotenv()
+
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+# Listings embed stock and rating aggregates, which every order and review
+# changes. Rather than retiring all listings on each of those, listing keys
+# (and so their ETags) roll over every CATALOG_LISTING_TTL seconds, which
+# bounds how stale those fields can be.
+CATALOG_LISTING_TTL = int(os.getenv("CATALOG_LISTING_TTL", "30"))
+# How long browsers and CDNs may reuse a catalog response before revalidating
+CATALOG_HTTP_MAX_AGE = int(os.getenv("CATALOG_HTTP_MAX_AGE", "60"))
+
+# Product listings are keyed on the products version, and everything that
+# nests a category is keyed on the categories version, so bumping a version
+# retires every dependent entry without having to enumerate keys.
+PRODUCTS_VERSION_KEY = "catalog:products:version"
+CATEGORIES_VERSION_KEY = "catalog:categories:version"
+
+async def product_key(product_id: int) -> str:
+    """Cache key for a single product's response."""
+    categories_version = await cache.get_counter(CATEGORIES_VERSION_KEY)
+    return f"catalog:product:{product_id}:c{categories_version}"
+
+async def product_list_key(params: Dict[str, Any]) -> str:
+    """Cache key for a product listing with the given query parameters."""
+    products_version = await cache.get_counter(PRODUCTS_VERSION_KEY)
+    categories_version = await cache.get_counter(CATEGORIES_VERSION_KEY)
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    # Wall-clock windows, so every worker rolls over at the same moment
+    window = int(time.time() // CATALOG_LISTING_TTL)
+    return f"catalog:products:p{products_version}:c{categories_version}:w{window}:{digest}"
+
+async def category_list_key() -> str:
+    """Cache key for the active category list."""
+    categories_version = await cache.get_counter(CATEGORIES_VERSION_KEY)
+    return f"catalog:categories:c{categories_version}"
+
+def catalog_etag(cache_key: str, *row_versions: Any) -> str:
+    """Strong ETag for the catalog response cached under ``cache_key``.
+    
+    The key already carries the version counters the response depends on, so
+    the tag changes whenever the cached entry would be retired.
+    """
+    digest = hashlib.sha1(
+        ":".join([cache.counter_epoch, cache_key, *map(str, row_versions)]).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+async def products_changed(*product_ids: int):
+    """Invalidate cached entries for changed products and all listings.
+    
+    For edits to what a listing filters or sorts on: names, descriptions,
+    prices, categories and active flags.
+    """
+    await cache.incr(PRODUCTS_VERSION_KEY)
+    if product_ids:
+        await cache.delete(*[await product_key(product_id) for product_id in product_ids])
+
+async def product_stats_changed(*product_ids: int):
+    """Invalidate the cached products whose stock or ratings changed.
+    
+    Listings are left alone and pick the new figures up when their window
+    rolls over (CATALOG_LISTING_TTL).
+    """
+    if product_ids:
+        await cache.delete(*[await product_key(product_id) for product_id in product_ids])
+
+async def categories_changed():
+    """Invalidate everything that embeds category data."""
+    await cache.incr(CATEGORIES_VERSION_KEY)
@@ -0,0 +1,69 @@
+from typing import AsyncIterator, Sequence, Type
+import csv
+import io
+import os
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from database import AsyncSessionLocal
+
+load_dotenv()
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+async def _stream_batches(query) -> AsyncIterator[Sequence]:
+    # The export outlives the request's session, so it reads with its own. The
+    # identity map only holds weak references, so each batch is freed once the
+    # caller has written it out.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for batch in result.partitions():
+            yield batch
+
+async def _ndjson_lines(query, schema: Type[BaseModel]) -> AsyncIterator[str]:
+    async for batch in _stream_batches(query):
+        yield "".join(schema.model_validate(row).model_dump_json() + "\n" for row in batch)
+
+async def _csv_lines(query, schema: Type[BaseModel], columns: Sequence[str]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in _stream_batches(query):
+        for row in batch:
+            data = schema.model_validate(row).model_dump(mode="json")
+            writer.writerow([data[column] for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_response(
+    query,
+    schema: Type[BaseModel],
+    columns: Sequence[str],
+    export_format: str,
+    filename: str
+) -> StreamingResponse:
+    """Stream the rows of ``query`` as NDJSON (full schema) or CSV (``columns`` only).
+    
+    Rows are read through a server-side cursor in EXPORT_BATCH_SIZE batches and
+    written out as they arrive, so memory use does not grow with the table.
+    """
+    if export_format == "csv":
+        body = _csv_lines(query, schema, columns)
+    else:
+        body = _ndjson_lines(query, schema)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
@@ -0,0 +1,202 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import SECRET_KEY
+from cache import cache
+from carts import build_summary, cart_changed, upsert_cart_items
+from inventory import available_stock
+from loaders import PRODUCT_RESPONSE
+from models import Product
+from schemas import ProductResponse
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Guest carts live in the cache backend (use Redis when running several
+# workers), keyed by a random id carried in an HMAC-signed cookie. They hold
+# no stock; stock is reserved once the cart is merged into cart_items at login.
+GUEST_CART_COOKIE = os.getenv("GUEST_CART_COOKIE", "guest_cart")
+GUEST_CART_TTL = int(os.getenv("GUEST_CART_TTL", str(7 * 24 * 3600)))
+GUEST_CART_MAX_ITEMS = int(os.getenv("GUEST_CART_MAX_ITEMS", "50"))
+GUEST_CART_COOKIE_SECURE = os.getenv("GUEST_CART_COOKIE_SECURE", "false").lower() == "true"
+GUEST_CART_SECRET = os.getenv("GUEST_CART_SECRET", SECRET_KEY)
+
+def _signature(cart_id: str) -> str:
+    digest = hmac.new(GUEST_CART_SECRET.encode(), cart_id.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def new_cart_token() -> str:
+    """Create a signed cookie value for a new guest cart."""
+    cart_id = secrets.token_urlsafe(16)
+    return f"{cart_id}.{_signature(cart_id)}"
+
+def cart_id_from_token(token: Optional[str]) -> Optional[str]:
+    """Return the cart id of a cookie value, or None if it is missing or forged."""
+    if not token or "." not in token:
+        return None
+    cart_id, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _signature(cart_id)):
+        return None
+    return cart_id
+
+def _key(cart_id: str) -> str:
+    return f"guest_cart:{cart_id}"
+
+async def load_lines(cart_id: str) -> Dict[int, Dict[str, Any]]:
+    """A guest cart's lines: product id -> {"quantity", "created_at"}."""
+    lines = await cache.get(_key(cart_id)) or {}
+    # MemoryCache returns the stored objects; copy them so updates to a line
+    # only reach the cache through save_lines
+    return {int(product_id): dict(line) for product_id, line in lines.items()}
+
+async def save_lines(cart_id: str, lines: Dict[int, Dict[str, Any]]):
+    """Store a guest cart's lines, restarting its TTL, or drop it when empty."""
+    if not lines:
+        await cache.delete(_key(cart_id))
+        return
+    # JSON object keys are strings, whichever backend stores them
+    await cache.set(_key(cart_id), {str(product_id): line for product_id, line in lines.items()}, GUEST_CART_TTL)
+
+async def _check_available(db: AsyncSession, quantities: Dict[int, int]):
+    """Raise 404/400 unless every product is active with enough unreserved stock."""
+    products = {
+        product.id: product
+        for product in (await db.execute(
+            select(Product.id, Product.name, Product.is_active, available_stock().label("available"))
+            .where(Product.id.in_(list(quantities)))
+        )).all()
+    }
+    for product_id in sorted(quantities):
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            raise HTTPException(status_code=404, detail="Product not found")
+        available = max(product.available, 0)
+        if quantities[product_id] > available:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough stock for {product.name}. Available: {available}, Requested: {quantities[product_id]}"
+            )
+
+async def cart_items(db: AsyncSession, cart_id: str, product_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Serialize a guest cart like CartItemResponse, using the product id as item id."""
+    lines = await load_lines(cart_id)
+    if product_ids is not None:
+        lines = {product_id: lines[product_id] for product_id in product_ids if product_id in lines}
+    if not lines:
+        return []
+    
+    products = (await db.scalars(
+        select(Product)
+        .options(*PRODUCT_RESPONSE)
+        .where(Product.id.in_(list(lines)), Product.is_active == True)
+        .order_by(Product.id)
+    )).all()
+    return [
+        {
+            "id": product.id,
+            "product_id": product.id,
+            "quantity": lines[product.id]["quantity"],
+            "created_at": lines[product.id]["created_at"],
+            "updated_at": lines[product.id].get("updated_at"),
+            "product": ProductResponse.model_validate(product),
+        }
+        for product in products
+    ]
+
+async def summary(db: AsyncSession, cart_id: str) -> Dict[str, Any]:
+    """A guest cart's CartSummary; guests hold no stock, so all of it counts as theirs to take."""
+    lines = await load_lines(cart_id)
+    if not lines:
+        return build_summary([], 0, 0, 0.0)
+    
+    products = (await db.execute(
+        select(Product.id, Product.name, Product.price, Product.is_active, available_stock().label("available"))
+        .where(Product.id.in_(list(lines)))
+        .order_by(Product.id)
+    )).all()
+    summary_lines = [
+        {
+            "item_id": product.id,
+            "product_id": product.id,
+            "name": product.name,
+            "price": product.price,
+            "quantity": lines[product.id]["quantity"],
+            "available": max(product.available, 0) if product.is_active else 0,
+        }
+        for product in products
+    ]
+    return build_summary(
+        summary_lines,
+        len(summary_lines),
+        sum(line["quantity"] for line in summary_lines),
+        sum(line["price"] * line["quantity"] for line in summary_lines)
+    )
+
+async def set_quantities(db: AsyncSession, cart_id: str, quantities: Dict[int, int], replace: bool = False):
+    """Add ``quantities`` to a guest cart (or set them, with ``replace``)."""
+    if any(quantity < 1 for quantity in quantities.values()):
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    
+    lines = await load_lines(cart_id)
+    totals = {
+        product_id: quantity if replace or product_id not in lines else lines[product_id]["quantity"] + quantity
+        for product_id, quantity in quantities.items()
+    }
+    if len(lines.keys() | totals.keys()) > GUEST_CART_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A guest cart can hold at most {GUEST_CART_MAX_ITEMS} products")
+    await _check_available(db, totals)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    for product_id, quantity in totals.items():
+        if product_id in lines:
+            lines[product_id].update(quantity=quantity, updated_at=now)
+        else:
+            lines[product_id] = {"quantity": quantity, "created_at": now}
+    await save_lines(cart_id, lines)
+
+async def remove_line(cart_id: str, product_id: int) -> bool:
+    """Remove one product from a guest cart; False if it was not there."""
+    lines = await load_lines(cart_id)
+    if lines.pop(product_id, None) is None:
+        return False
+    await save_lines(cart_id, lines)
+    return True
+
+async def clear(cart_id: str):
+    await cache.delete(_key(cart_id))
+
+async def merge_into_user_cart(db: AsyncSession, user_id: int, cart_id: str):
+    """Move a guest cart into the user's cart_items and delete it.
+    
+    All lines are upserted in one transaction. If that fails because a
+    product has gone or run short, lines are retried one at a time and the
+    ones that still fail are dropped, so a stale guest cart never blocks login.
+    """
+    lines = await load_lines(cart_id)
+    if not lines:
+        return
+    quantities = {product_id: line["quantity"] for product_id, line in lines.items()}
+    
+    try:
+        await upsert_cart_items(db, user_id, quantities)
+        await db.commit()
+    except HTTPException:
+        for product_id, quantity in quantities.items():
+            try:
+                await upsert_cart_items(db, user_id, {product_id: quantity})
+                await db.commit()
+            except HTTPException as e:
+                logger.info("Dropped product %s from guest cart merge: %s", product_id, e.detail)
+    await clear(cart_id)
+    await cart_changed(user_id)
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+import re
+import sys
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine
+from models import (
+    CartItem,
+    Order,
+    OrderItem,
+    Product,
+    ProductSalesRollup,
+    Review,
+    StockReservation,
+    User,
+    WebhookEvent,
+    WishlistItem,
+)
+
+# Tables expected to grow without bound; a sequential scan on any of them in a
+# hot query is a missing index. Small lookup tables (categories) are exempt.
+LARGE_TABLES = {
+    "users",
+    "products",
+    "cart_items",
+    "orders",
+    "order_items",
+    "reviews",
+    "stock_reservations",
+    "product_sales_rollups",
+    "webhook_events",
+    "wishlist_items",
+}
+
+# The filters the routers run on every request, with representative values.
+HOT_QUERIES = {
+    "cart.get_cart": select(CartItem).where(CartItem.user_id == 1),
+    "cart.add_to_cart": select(CartItem).where(
+        and_(CartItem.user_id == 1, CartItem.product_id == 1)
+    ),
+    "orders.get_orders": select(Order).where(Order.user_id == 1).order_by(Order.created_at.desc()),
+    "orders.order_items": select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])),
+    "webhooks.payment_intent": select(Order).where(Order.stripe_payment_intent_id == "pi_1"),
+    "products.get_products": select(Product).where(
+        and_(Product.is_active == True, Product.category_id == 1, Product.price >= 10)
+    ),
+    "products.get_reviews": select(Review).where(Review.product_id == 1).order_by(Review.id.desc()),
+    "products.top_rated": select(Product).order_by(Product.rating_average.desc(), Product.id.desc()).limit(20),
+    "products.create_review": select(Review).where(
+        and_(Review.user_id == 1, Review.product_id == 1)
+    ),
+    "wishlist.contains": select(WishlistItem.product_id).where(
+        and_(WishlistItem.user_id == 1, WishlistItem.product_id.in_([1, 2, 3]))
+    ),
+    "auth.load_user": select(User).where(User.username == "alice"),
+    "inventory.available_stock": select(func.sum(StockReservation.quantity)).where(
+        and_(StockReservation.product_id == 1, StockReservation.expires_at > func.now())
+    ),
+    "inventory.release_expired": select(StockReservation.id).where(
+        StockReservation.expires_at <= func.now()
+    ),
+    "webhook_worker.claim_event": select(WebhookEvent.id).where(
+        and_(WebhookEvent.status == "PENDING", WebhookEvent.next_attempt_at <= func.now())
+    ).order_by(WebhookEvent.next_attempt_at),
+    "admin.top_products": select(ProductSalesRollup).where(ProductSalesRollup.day >= func.current_date()),
+}
+
+def _explain(conn: Connection, statement) -> List[str]:
+    sql = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "postgresql":
+        return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}")]
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+def _scanned_tables(plan: List[str], dialect: str) -> List[str]:
+    if dialect == "postgresql":
+        pattern = r"Seq Scan on (\w+)"
+    else:
+        # "SCAN t USING INDEX ..." walks an index; a bare "SCAN t" reads the table
+        pattern = r"^SCAN (?:TABLE )?(\w+)\b(?!.*USING)"
+    return [match.group(1) for line in plan for match in [re.search(pattern, line)] if match]
+
+def find_sequential_scans(bind: Engine = engine, queries: Dict[str, object] = HOT_QUERIES) -> List[Tuple[str, str]]:
+    """Return (query name, table) for each hot query that scans a large table.
+    
+    On PostgreSQL sequential scans are disabled for the check, so a small or
+    empty database still reveals queries that have no usable index at all.
+    """
+    findings = []
+    with bind.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, statement in queries.items():
+            for table in _scanned_tables(_explain(conn, statement), conn.dialect.name):
+                if table in LARGE_TABLES:
+                    findings.append((name, table))
+        conn.rollback()
+    return findings
+
+def assert_no_sequential_scans(bind: Engine = engine):
+    """Fail if any hot query plans a sequential scan on a large table."""
+    findings = find_sequential_scans(bind)
+    if findings:
+        detail = ", ".join(f"{name} scans {table}" for name, table in findings)
+        raise AssertionError(f"Sequential scans in hot queries (missing index?): {detail}")
+
+if __name__ == "__main__":
+    findings = find_sequential_scans()
+    for name, table in findings:
+        print(f"{name}: sequential scan on {table}")
+    if not findings:
+        print(f"All {len(HOT_QUERIES)} hot queries use an index")
+    sys.exit(1 if findings else 0)
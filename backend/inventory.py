@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+import os
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Product, StockReservation
+
+load_dotenv()
+
+# Stock added to a cart is held for this long. Expired holds stop counting at
+# once; a background sweeper deletes their rows.
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_INTERVAL = int(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = int(os.getenv("RESERVATION_SWEEP_BATCH", "1000"))
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+async def lock_holds(db: AsyncSession, user_id: int, product_ids: Optional[Iterable[int]] = None) -> Dict[int, StockReservation]:
+    """Lock and return a user's holds, keyed by product id.
+    
+    Holds are always locked before products, so checkout cannot deadlock
+    against cart writes or the sweeper.
+    """
+    query = select(StockReservation).where(StockReservation.user_id == user_id)
+    if product_ids is not None:
+        query = query.where(StockReservation.product_id.in_(list(product_ids)))
+    holds = (await db.scalars(
+        query.order_by(StockReservation.product_id).with_for_update()
+    )).all()
+    return {hold.product_id: hold for hold in holds}
+
+def available_stock(user_id: Optional[int] = None):
+    """SQL expression: a product's stock less the unexpired holds of other users.
+    
+    Correlates with Product in the enclosing query. Without ``user_id`` every
+    hold counts, as for a guest, who holds nothing.
+    """
+    holds = select(func.coalesce(func.sum(StockReservation.quantity), 0)).where(
+        StockReservation.product_id == Product.id,
+        StockReservation.expires_at > _now()
+    )
+    if user_id is not None:
+        holds = holds.where(StockReservation.user_id != user_id)
+    return Product.stock_quantity - holds.scalar_subquery()
+
+async def _check_available(db: AsyncSession, products: Dict[int, Any], targets: Dict[int, int]):
+    for product_id in sorted(targets):
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="Product not found")
+    for product_id in sorted(targets):
+        product = products[product_id]
+        if targets[product_id] > product.available:
+            await db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Not enough stock for {product.name}. Available: {max(product.available, 0)}, Requested: {targets[product_id]}"
+            )
+
+async def hold_stock(db: AsyncSession, user_id: int, targets: Dict[int, int]):
+    """Set the user's holds on each product to the target quantity.
+    
+    Holds are rows in stock_reservations only; the products table is read,
+    never written, so shoppers of one hot product do not queue on its row.
+    Two shoppers racing for the last units can both get a hold; checkout,
+    which locks the product and checks stock, decides between them. A target
+    of 0 releases the hold. Does not commit; raises HTTPException (after
+    rolling back) if any product is missing, inactive or short of stock, or
+    a target is negative.
+    """
+    if not targets:
+        return
+    if any(quantity < 0 for quantity in targets.values()):
+        raise HTTPException(status_code=400, detail="Quantity cannot be negative")
+    holds = await lock_holds(db, user_id, targets)
+    
+    # Holds that shrink or stay the same need no stock check
+    raised = [
+        product_id for product_id, quantity in targets.items()
+        if quantity > (holds[product_id].quantity if product_id in holds else 0)
+    ]
+    if raised:
+        rows = (await db.execute(
+            select(Product.id, Product.name, Product.is_active, available_stock(user_id).label("available"))
+            .where(Product.id.in_(raised))
+        )).all()
+        await _check_available(db, {row.id: row for row in rows}, {product_id: targets[product_id] for product_id in raised})
+    
+    expires_at = _now() + timedelta(seconds=RESERVATION_TTL_SECONDS)
+    for product_id, quantity in targets.items():
+        hold = holds.get(product_id)
+        if quantity == 0:
+            if hold is not None:
+                await db.delete(hold)
+        elif hold is not None:
+            hold.quantity = quantity
+            hold.expires_at = expires_at
+        else:
+            db.add(StockReservation(
+                user_id=user_id,
+                product_id=product_id,
+                quantity=quantity,
+                expires_at=expires_at
+            ))
+
+async def sell_stock(db: AsyncSession, user_id: int, quantities: Dict[int, int]) -> bool:
+    """Take sold quantities out of stock, consuming the user's holds.
+    
+    Stock for every product is updated by one guarded UPDATE that leaves
+    other users' unexpired holds covered and never takes stock below zero;
+    returns False without changing anything if any product fell short.
+    """
+    ordered = case(quantities, value=Product.id)
+    result = await db.execute(
+        update(Product)
+        .where(and_(
+            Product.id.in_(list(quantities)),
+            ordered > 0,
+            Product.stock_quantity - ordered >= 0,
+            available_stock(user_id) >= ordered
+        ))
+        .values(stock_quantity=Product.stock_quantity - ordered)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        return False
+    
+    # Holds on products that are no longer in the cart go back to the pool too
+    await release_holds(db, user_id)
+    return True
+
+async def release_holds(db: AsyncSession, user_id: int, product_ids: Optional[Iterable[int]] = None):
+    """Release a user's holds (all of them, or only on ``product_ids``). Does not commit."""
+    query = delete(StockReservation).where(StockReservation.user_id == user_id)
+    if product_ids is not None:
+        query = query.where(StockReservation.product_id.in_(list(product_ids)))
+    await db.execute(query)
+
+async def release_expired(db: AsyncSession) -> int:
+    """Release one batch of expired holds and return how many were released."""
+    expired_ids = (await db.scalars(
+        select(StockReservation.id)
+        .where(StockReservation.expires_at <= _now())
+        .order_by(StockReservation.id)
+        .limit(RESERVATION_SWEEP_BATCH)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not expired_ids:
+        return 0
+    
+    await db.execute(delete(StockReservation).where(StockReservation.id.in_(expired_ids)))
+    await db.commit()
+    return len(expired_ids)
+
+async def sweep_expired_reservations():
+    """Release expired holds until none are left; run periodically in the background."""
+    async with AsyncSessionLocal() as db:
+        while await release_expired(db) == RESERVATION_SWEEP_BATCH:
+            pass
@@ -0,0 +1,40 @@
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
+from models import CartItem, Order, OrderItem, Product, Review, User, WishlistItem
+
+# Loader options matching the nested relationships of each response schema.
+# Many-to-one links are joined into the main query and collections are fetched
+# with one extra IN query, so the statement count stays flat as results grow.
+# raiseload("*") turns any relationship a schema starts nesting without a
+# matching loader into an error instead of a silent per-row query.
+
+PRODUCT_RESPONSE = (
+    joinedload(Product.category),
+    raiseload("*"),
+)
+
+CART_ITEM_RESPONSE = (
+    joinedload(CartItem.product).joinedload(Product.category),
+    raiseload("*"),
+)
+
+WISHLIST_ITEM_RESPONSE = (
+    joinedload(WishlistItem.product).joinedload(Product.category),
+    raiseload("*"),
+)
+
+ORDER_RESPONSE = (
+    selectinload(Order.order_items)
+    .joinedload(OrderItem.product)
+    .joinedload(Product.category),
+    raiseload("*"),
+)
+
+REVIEW_RESPONSE = (
+    # Only the columns ReviewAuthor exposes, not the whole user row
+    joinedload(Review.user).load_only(User.id, User.first_name, User.last_name),
+    raiseload("*"),
+)
+
+USER_RESPONSE = (
+    raiseload("*"),
+)
@@ -1,28 +1,51 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer
+from sqlalchemy import text
 from contextlib import asynccontextmanager
+import logging
 import os
 from dotenv import load_dotenv
 
-from database import engine, Base
-from routers import auth, products, cart, orders, admin, webhooks
+from database import async_engine, pool_status
+from cache import cache
+from auth import password_hasher
+from inventory import RESERVATION_SWEEP_INTERVAL, sweep_expired_reservations
+from rollups import ROLLUP_RECONCILE_INTERVAL, reconcile_recent_rollups
+from tasks import start_periodic, stop_background_tasks
+from payments import payment_gateway
+from webhook_worker import WEBHOOK_POLL_INTERVAL, WEBHOOK_WORKERS, event_recorded, process_due_events
+from routers import auth, products, cart, orders, admin, webhooks, wishlist
 from middleware import setup_middleware
+from metrics import metrics
+from migrate import prepare_schema
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    # Check (or, depending on DB_SCHEMA_MODE, migrate) the database schema
+    prepare_schema()
+    start_periodic("reservation-sweeper", sweep_expired_reservations, RESERVATION_SWEEP_INTERVAL)
+    start_periodic("rollup-reconciler", reconcile_recent_rollups, ROLLUP_RECONCILE_INTERVAL)
+    for worker in range(WEBHOOK_WORKERS):
+        start_periodic(f"webhook-worker-{worker}", process_due_events, WEBHOOK_POLL_INTERVAL, event_recorded)
     yield
+    await stop_background_tasks()
+    await payment_gateway.close()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="E-Commerce Store API",
     description="A comprehensive e-commerce API with FastAPI",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -42,6 +65,7 @@ app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(products.router, prefix="/api/products", tags=["products"])
 app.include_router(cart.router, prefix="/api/cart", tags=["cart"])
 app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
+app.include_router(wishlist.router, prefix="/api/wishlist", tags=["wishlist"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(webhooks.router, prefix="/api/webhooks", tags=["webhooks"])
 
@@ -53,6 +77,31 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/db")
+async def db_health_check():
+    """Check database connectivity and report connection pool usage."""
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        # The error can name the host, database and user; keep it in the logs
+        logger.exception("Database health check failed")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database unavailable"
+        )
+    return {"status": "healthy", "pool": pool_status()}
+
+@app.get("/health/cache")
+async def cache_health_check():
+    """Report cache hit, miss and eviction counters."""
+    return {"status": "healthy", "cache": cache.info()}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Request metrics of this worker process in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
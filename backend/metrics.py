@@ -0,0 +1,120 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram bucket upper bounds: request latency in seconds, and statements
+# per request (a jump in the higher query buckets usually means an N+1).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class RequestStats:
+    """Database work done on behalf of the current request."""
+    
+    __slots__ = ("db_queries", "db_time")
+    
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+
+# Set by the instrumentation middleware for the duration of each request.
+# SQLAlchemy runs async statements in a greenlet that shares the caller's
+# context, so the engine listeners below see the request's stats.
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if request_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.db_queries += 1
+        stats.db_time += time.perf_counter() - started.pop()
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+    
+    __slots__ = ("buckets", "counts", "sum", "count")
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+class MetricsRegistry:
+    """Per-route request metrics for this worker process."""
+    
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.db_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_time: Dict[Tuple[str, str], float] = {}
+    
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        key = (method, route)
+        self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.db_queries[key] = Histogram(QUERY_BUCKETS)
+            self.db_time[key] = 0.0
+        self.latency[key].observe(duration)
+        self.db_queries[key].observe(stats.db_queries)
+        self.db_time[key] += stats.db_time
+    
+    def _histogram_lines(self, name: str, histograms: Dict[Tuple[str, str], Histogram]) -> List[str]:
+        lines = []
+        for (method, route), histogram in sorted(histograms.items()):
+            labels = _labels(method=method, route=route)
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return lines
+    
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP http_requests_total Requests handled, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+        
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        lines += self._histogram_lines("http_request_duration_seconds", self.latency)
+        
+        lines += [
+            "# HELP http_request_db_queries SQL statements executed per request, by route.",
+            "# TYPE http_request_db_queries histogram",
+        ]
+        lines += self._histogram_lines("http_request_db_queries", self.db_queries)
+        
+        lines += [
+            "# HELP http_request_db_seconds_total Time spent in SQL statements, by route.",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(self.db_time.items()):
+            lines.append(f"http_request_db_seconds_total{{{_labels(method=method, route=route)}}} {seconds}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
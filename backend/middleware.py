@@ -1,31 +1,207 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from typing import Any, Callable, Dict, Optional
+import gzip
+import json
+import os
+import random
 import time
 import logging
+from dotenv import load_dotenv
+
+from metrics import RequestStats, metrics, request_stats
+from responses import CONTENT_CODINGS
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzipped
+    brotli = None
+
+load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+# Fraction of requests written to the access log. Server errors and requests
+# slower than ACCESS_LOG_SLOW_SECONDS are always logged.
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.01"))
+ACCESS_LOG_SLOW_SECONDS = float(os.getenv("ACCESS_LOG_SLOW_SECONDS", "1.0"))
+
+# Route label for requests that matched no route, so stray paths cannot
+# create unbounded metric series
+UNMATCHED_ROUTE = "unmatched"
+
+# Bodies smaller than this are sent as they are: below about a kilobyte the
+# bytes saved do not pay for the compression and the extra headers.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+# Per-request levels: close to the best ratio of each codec at a fraction of its CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+def _preferred_coding(accept_encoding: str) -> Optional[str]:
+    """Brotli if available and accepted, else gzip if accepted, else None."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    for coding in CONTENT_CODINGS:
+        if coding in accepted and (coding != "br" or brotli is not None):
+            return coding
+    return None
+
+def _compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing response bodies with brotli or gzip.
+    
+    Only complete (non-streamed) bodies of at least ``min_size`` bytes and a
+    textual content type are compressed. The ETag of a compressed response
+    gets a "-<coding>" suffix, which responses.is_not_modified ignores.
+    """
+    
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        coding = _preferred_coding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        started = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, started
+            if started:
+                await send(message)
+                return
+            
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES) or "content-encoding" in headers:
+                    started = True
+                    await send(message)
+                    return
+                # The representation depends on Accept-Encoding, for caches too
+                headers.add_vary_header("Accept-Encoding")
+                if coding is None:
+                    started = True
+                    await send(message)
+                    return
+                # Held back until the body shows whether it is worth compressing
+                start_message = message
+                return
+            
+            started = True
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < self.min_size:
+                await send(start_message)
+                await send(message)
+                return
+            
+            body = _compress(body, coding)
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            etag = headers.get("etag")
+            if etag is not None and etag.endswith('"'):
+                headers["ETag"] = f'{etag[:-1]}-{coding}"'
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+        
+        await self.app(scope, receive, send_compressed)
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware recording metrics and sampled access logs.
+    
+    Adds X-Process-Time to every response and feeds metrics.metrics with the
+    route template (not the raw path), status, latency and DB work.
+    """
+    
+    def __init__(self, app, sample_rate: float = ACCESS_LOG_SAMPLE_RATE, slow_seconds: float = ACCESS_LOG_SLOW_SECONDS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._route_paths: Dict[Callable, str] = {}
+    
+    def _route(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self._route_paths[endpoint] = path = path or UNMATCHED_ROUTE
+        return path
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code = 500
+        
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", f"{time.perf_counter() - start:.6f}")
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            duration = time.perf_counter() - start
+            route = self._route(scope)
+            metrics.observe(scope["method"], route, status_code, duration, stats)
+            if status_code >= 500 or duration >= self.slow_seconds or random.random() < self.sample_rate:
+                self._log(scope, route, status_code, duration, stats)
+    
+    def _log(self, scope: Dict[str, Any], route: str, status_code: int, duration: float, stats: RequestStats):
+        # The query string is left out: it can carry tokens and personal data
+        client: Optional[tuple] = scope.get("client")
+        access_logger.info(json.dumps({
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "db_queries": stats.db_queries,
+            "db_ms": round(stats.db_time * 1000, 3),
+            "client": client[0] if client else None,
+        }))
 
 def setup_middleware(app):
     """Setup custom middleware for the FastAPI app."""
     
-    @app.middleware("http")
-    async def add_process_time_header(request: Request, call_next):
-        """Add processing time to response headers."""
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
-    
-    @app.middleware("http")
-    async def log_requests(request: Request, call_next):
-        """Log all incoming requests."""
-        logger.info(f"{request.method} {request.url} - {request.client.host}")
-        response = await call_next(request)
-        logger.info(f"Response: {response.status_code}")
-        return response
+    # Added last, so outermost: the recorded latency includes compression
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(InstrumentationMiddleware)
     
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
@@ -36,7 +212,9 @@ def setup_middleware(app):
                 "error": True,
                 "message": exc.detail,
                 "status_code": exc.status_code
-            }
+            },
+            # Keep Retry-After, WWW-Authenticate and the like
+            headers=exc.headers
         )
     
     @app.exception_handler(Exception)
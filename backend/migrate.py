@@ -0,0 +1,78 @@
+import os
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from database import Base, engine
+
+load_dotenv()
+
+# What each process does with the schema at startup:
+#   verify  - only check the database is at the latest revision (the default;
+#             run `alembic upgrade head` once per deploy, before the workers)
+#   migrate - upgrade to the latest revision, serialised by an advisory lock
+#   create  - create_all() and stamp, for throwaway SQLite databases
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "verify")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Arbitrary key for the PostgreSQL advisory lock held while migrating
+MIGRATION_LOCK_ID = 7210348
+
+def alembic_config(connection=None) -> Config:
+    """Alembic config for the app's migrations, optionally bound to ``connection``."""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def verify_schema(bind: Engine = engine):
+    """Fail fast unless the database is at the latest migration.
+    
+    Reads a single row from alembic_version instead of reflecting the schema,
+    so it stays cheap however many workers start at once.
+    """
+    with bind.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    head = head_revision()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}. Run 'alembic upgrade head'."
+        )
+
+def upgrade_schema(bind: Engine = engine):
+    """Upgrade to the latest migration; concurrent callers wait for the first."""
+    with bind.connect() as conn:
+        postgresql = conn.dialect.name == "postgresql"
+        if postgresql:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+        try:
+            command.upgrade(alembic_config(conn), "head")
+        finally:
+            if postgresql:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                conn.commit()
+
+def create_schema(bind: Engine = engine):
+    """Create every table directly from the models and mark it as up to date."""
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        command.stamp(alembic_config(conn), "head")
+
+def prepare_schema():
+    """Bring the schema up according to DB_SCHEMA_MODE."""
+    if DB_SCHEMA_MODE == "create":
+        create_schema()
+    elif DB_SCHEMA_MODE == "migrate":
+        upgrade_schema()
+    else:
+        verify_schema()
@@ -0,0 +1,112 @@
+"""full-text search, stock reservations and analytics rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+SEARCH_VECTOR_TRIGGER = (
+    "CREATE TRIGGER products_search_vector_update "
+    "BEFORE INSERT OR UPDATE OF name, description ON products "
+    "FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()"
+)
+BACKFILL_BATCH = 10000
+
+
+def _add_search_vector() -> None:
+    # tsvector column searched by search.py. Adding a nullable column without
+    # a default only touches the catalog; a generated column would rewrite the
+    # table under an ACCESS EXCLUSIVE lock. The trigger keeps new writes up to
+    # date, existing rows are filled in short batches, and the GIN index is
+    # built concurrently in the next revision.
+    op.execute("ALTER TABLE products ADD COLUMN search_vector tsvector")
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    op.execute(SEARCH_VECTOR_TRIGGER)
+    backfill = sa.text(
+        "UPDATE products SET search_vector = "
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B') "
+        "WHERE id > :start AND id <= :end AND search_vector IS NULL"
+    )
+    last_id = op.get_bind().scalar(sa.text("SELECT coalesce(max(id), 0) FROM products"))
+    # Each batch commits on its own, so no row stays locked for long
+    with op.get_context().autocommit_block():
+        for start in range(0, last_id, BACKFILL_BATCH):
+            op.get_bind().execute(backfill, {"start": start, "end": start + BACKFILL_BATCH})
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _add_search_vector()
+
+    op.add_column('products', sa.Column('reserved_quantity', sa.Integer(), server_default='0', nullable=False))
+
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'product_id', name='uq_stock_reservations_user_product')
+    )
+    op.create_index(op.f('ix_stock_reservations_expires_at'), 'stock_reservations', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_stock_reservations_id'), 'stock_reservations', ['id'], unique=False)
+
+    op.create_table('daily_sales_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('orders_count', sa.Integer(), nullable=False),
+    sa.Column('completed_orders', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('product_sales_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_sales_rollups')
+    op.drop_table('daily_sales_rollups')
+
+    op.drop_index(op.f('ix_stock_reservations_id'), table_name='stock_reservations')
+    op.drop_index(op.f('ix_stock_reservations_expires_at'), table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('reserved_quantity')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER products_search_vector_update ON products")
+        op.execute("DROP FUNCTION products_search_vector_update()")
+        op.drop_column('products', 'search_vector')
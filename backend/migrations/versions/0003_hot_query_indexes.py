@@ -0,0 +1,87 @@
+"""indexes for the routers' hot queries
+
+On PostgreSQL every index is built with CREATE INDEX CONCURRENTLY outside the
+migration transaction, so the tables stay writable while this runs. If a
+concurrent build fails it leaves an INVALID index behind; drop it and rerun.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_products_active_category_price', 'products', ['is_active', 'category_id', 'price']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_stripe_payment_intent_id', 'orders', ['stripe_payment_intent_id']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+    ('ix_reviews_product_id_user_id', 'reviews', ['product_id', 'user_id']),
+]
+
+
+def _postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    # Merge duplicate cart rows so (user_id, product_id) can be made unique
+    op.execute(
+        "UPDATE cart_items SET quantity = ("
+        "SELECT SUM(other.quantity) FROM cart_items other "
+        "WHERE other.user_id = cart_items.user_id AND other.product_id = cart_items.product_id"
+        ") WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+    )
+    op.execute(
+        "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)"
+    )
+
+    if not _postgresql():
+        with op.batch_alter_table('cart_items') as batch_op:
+            batch_op.create_unique_constraint('uq_cart_items_user_product', ['user_id', 'product_id'])
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        op.create_index(
+            'ix_products_search_vector', 'products', ['search_vector'],
+            postgresql_using='gin', postgresql_concurrently=True
+        )
+        # Build the unique index online, then attach it as the constraint
+        op.create_index(
+            'uq_cart_items_user_product', 'cart_items', ['user_id', 'product_id'],
+            unique=True, postgresql_concurrently=True
+        )
+    op.execute(
+        "ALTER TABLE cart_items ADD CONSTRAINT uq_cart_items_user_product "
+        "UNIQUE USING INDEX uq_cart_items_user_product"
+    )
+
+
+def downgrade() -> None:
+    if not _postgresql():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        with op.batch_alter_table('cart_items') as batch_op:
+            batch_op.drop_constraint('uq_cart_items_user_product', type_='unique')
+        return
+
+    op.drop_constraint('uq_cart_items_user_product', 'cart_items', type_='unique')
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_search_vector', table_name='products', postgresql_concurrently=True)
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,46 @@
+"""webhook event queue
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stripe_event_id', sa.String(), nullable=False),
+    sa.Column('event_type', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'PROCESSED', 'FAILED', name='webhookeventstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('stripe_event_id')
+    )
+    op.create_index(op.f('ix_webhook_events_id'), 'webhook_events', ['id'], unique=False)
+    op.create_index('ix_webhook_events_status_next_attempt_at', 'webhook_events', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_events_status_next_attempt_at', table_name='webhook_events')
+    op.drop_index(op.f('ix_webhook_events_id'), table_name='webhook_events')
+    op.drop_table('webhook_events')
+    # PostgreSQL keeps enum types after their tables are dropped
+    if op.get_bind().dialect.name == 'postgresql':
+        sa.Enum(name='webhookeventstatus').drop(op.get_bind(), checkfirst=True)
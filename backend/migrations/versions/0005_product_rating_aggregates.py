@@ -0,0 +1,76 @@
+"""product rating aggregates and review listing indexes
+
+Adds the denormalised review totals to products and fills them from the
+existing reviews. On PostgreSQL the indexes are built concurrently, as in 0003.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNT_COLUMNS = ['reviews_count', 'rating_sum'] + [f'rating_{stars}_count' for stars in range(1, 6)]
+
+INDEXES = [
+    ('ix_products_rating_average_id', 'products', ['rating_average', 'id']),
+    ('ix_reviews_product_id_id', 'reviews', ['product_id', 'id']),
+    ('ix_reviews_product_id_rating_id', 'reviews', ['product_id', 'rating', 'id']),
+]
+
+
+def _postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    for column in COUNT_COLUMNS:
+        op.add_column('products', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+    op.add_column('products', sa.Column('rating_average', sa.Float(), server_default='0', nullable=False))
+
+    stars = ", ".join(
+        f"rating_{n}_count = (SELECT COUNT(*) FROM reviews WHERE reviews.product_id = products.id AND reviews.rating = {n})"
+        for n in range(1, 6)
+    )
+    op.execute(
+        "UPDATE products SET "
+        "reviews_count = (SELECT COUNT(*) FROM reviews WHERE reviews.product_id = products.id), "
+        "rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.product_id = products.id), "
+        "rating_average = (SELECT COALESCE(AVG(CAST(rating AS FLOAT)), 0) FROM reviews WHERE reviews.product_id = products.id), "
+        f"{stars} "
+        "WHERE EXISTS (SELECT 1 FROM reviews WHERE reviews.product_id = products.id)"
+    )
+
+    if not _postgresql():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    if not _postgresql():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+    else:
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('rating_average')
+        for column in reversed(COUNT_COLUMNS):
+            batch_op.drop_column(column)
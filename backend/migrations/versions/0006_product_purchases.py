@@ -0,0 +1,46 @@
+"""purchase ledger for verified reviews
+
+Creates product_purchases and fills it from every paid order in one pass.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('product_purchases',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('first_order_id', sa.Integer(), nullable=False),
+    sa.Column('purchased_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['first_order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'product_id')
+    )
+
+    # Enum columns store the member name
+    op.execute(
+        "INSERT INTO product_purchases (user_id, product_id, first_order_id) "
+        "SELECT orders.user_id, order_items.product_id, MIN(orders.id) "
+        "FROM order_items JOIN orders ON order_items.order_id = orders.id "
+        "WHERE orders.payment_status = 'COMPLETED' "
+        "GROUP BY orders.user_id, order_items.product_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_purchases')
@@ -0,0 +1,49 @@
+"""one wishlist row per user and product
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 09:50:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM wishlist_items WHERE id NOT IN (SELECT MIN(id) FROM wishlist_items GROUP BY user_id, product_id)"
+    )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('wishlist_items') as batch_op:
+            batch_op.create_unique_constraint('uq_wishlist_items_user_product', ['user_id', 'product_id'])
+        return
+
+    # Build the unique index online, then attach it as the constraint
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_wishlist_items_user_product', 'wishlist_items', ['user_id', 'product_id'],
+            unique=True, postgresql_concurrently=True
+        )
+    op.execute(
+        "ALTER TABLE wishlist_items ADD CONSTRAINT uq_wishlist_items_user_product "
+        "UNIQUE USING INDEX uq_wishlist_items_user_product"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('wishlist_items') as batch_op:
+            batch_op.drop_constraint('uq_wishlist_items_user_product', type_='unique')
+        return
+
+    op.drop_constraint('uq_wishlist_items_user_product', 'wishlist_items', type_='unique')
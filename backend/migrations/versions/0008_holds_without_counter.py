@@ -0,0 +1,51 @@
+"""count stock holds from stock_reservations instead of a product counter
+
+Availability is now stock_quantity less the unexpired holds of other users,
+summed per product, so products.reserved_quantity is dropped. Dropping a
+column only rewrites the catalog on PostgreSQL; the index is built
+concurrently.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 11:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index(
+            'ix_stock_reservations_product_id_expires_at', 'stock_reservations', ['product_id', 'expires_at']
+        )
+        with op.batch_alter_table('products') as batch_op:
+            batch_op.drop_column('reserved_quantity')
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_stock_reservations_product_id_expires_at', 'stock_reservations', ['product_id', 'expires_at'],
+            postgresql_concurrently=True
+        )
+    op.drop_column('products', 'reserved_quantity')
+
+
+def downgrade() -> None:
+    op.add_column('products', sa.Column('reserved_quantity', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE products SET reserved_quantity = ("
+        "SELECT COALESCE(SUM(quantity), 0) FROM stock_reservations "
+        "WHERE stock_reservations.product_id = products.id AND expires_at > CURRENT_TIMESTAMP"
+        ")"
+    )
+    op.drop_index('ix_stock_reservations_product_id_expires_at', table_name='stock_reservations')
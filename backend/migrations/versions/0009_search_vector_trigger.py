@@ -0,0 +1,59 @@
+"""maintain products.search_vector with a trigger
+
+Revision 0002 used to add search_vector as a STORED generated column. Where
+it did, the column is turned into a plain one (PostgreSQL 13+ drops the
+expression without rewriting the table) and the trigger revision 0002 now
+creates takes over. Databases that ran the current 0002 are left alone.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+SEARCH_VECTOR_TRIGGER = (
+    "CREATE TRIGGER products_search_vector_update "
+    "BEFORE INSERT OR UPDATE OF name, description ON products "
+    "FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()"
+)
+
+
+def _generated() -> bool:
+    return bool(op.get_bind().scalar(sa.text(
+        "SELECT attgenerated <> '' FROM pg_attribute "
+        "WHERE attrelid = 'products'::regclass AND attname = 'search_vector'"
+    )))
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql' or not _generated():
+        return
+    op.execute("ALTER TABLE products ALTER COLUMN search_vector DROP EXPRESSION")
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    op.execute(SEARCH_VECTOR_TRIGGER)
+
+
+def downgrade() -> None:
+    # Nothing to undo: the trigger-maintained column is what 0002 creates now
+    pass
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -21,6 +21,11 @@ class PaymentStatus(str, enum.Enum):
     FAILED = "failed"
     REFUNDED = "refunded"
 
+class WebhookEventStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -56,6 +61,12 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Catalog listing: active products, optionally by category and price range
+        Index("ix_products_active_category_price", "is_active", "category_id", "price"),
+        # Top-rated listing, keyset-paginated on (rating_average, id)
+        Index("ix_products_rating_average_id", "rating_average", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
@@ -63,6 +74,15 @@ class Product(Base):
     price = Column(Float, nullable=False)
     image_url = Column(String)
     stock_quantity = Column(Integer, default=0)
+    # Review aggregates, kept in step with reviews by ratings.py
+    reviews_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_average = Column(Float, nullable=False, default=0, server_default="0")  # 0 until the first review
+    rating_1_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = Column(Integer, nullable=False, default=0, server_default="0")
     is_active = Column(Boolean, default=True)
     category_id = Column(Integer, ForeignKey("categories.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -74,9 +94,19 @@ class Product(Base):
     order_items = relationship("OrderItem", back_populates="product")
     wishlist_items = relationship("WishlistItem", back_populates="product")
     reviews = relationship("Review", back_populates="product")
+    reservations = relationship("StockReservation", back_populates="product")
+    
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating, 1 to 5."""
+        return {stars: getattr(self, f"rating_{stars}_count") or 0 for stars in range(1, 6)}
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # One row per product in a cart; also serves lookups by user_id alone
+        UniqueConstraint("user_id", "product_id", name="uq_cart_items_user_product"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -91,13 +121,16 @@ class CartItem(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     total_amount = Column(Float, nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
     payment_status = Column(Enum(PaymentStatus), default=PaymentStatus.PENDING)
-    stripe_payment_intent_id = Column(String)
+    stripe_payment_intent_id = Column(String, index=True)
     shipping_address = Column(Text, nullable=False)
     billing_address = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -111,8 +144,8 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)  # Price at time of order
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -121,8 +154,22 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="order_items")
     product = relationship("Product", back_populates="order_items")
 
+# One row per product a user has paid for, so verified-purchase checks are a
+# primary-key lookup instead of a join over orders. Maintained by purchases.py.
+class ProductPurchase(Base):
+    __tablename__ = "product_purchases"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    first_order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    purchased_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class WishlistItem(Base):
     __tablename__ = "wishlist_items"
+    __table_args__ = (
+        # One row per product in a wishlist; also serves lookups by user_id alone
+        UniqueConstraint("user_id", "product_id", name="uq_wishlist_items_user_product"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -135,6 +182,12 @@ class WishlistItem(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        Index("ix_reviews_product_id_user_id", "product_id", "user_id"),
+        # Review listing, newest (by id) or by rating, keyset-paginated with id
+        Index("ix_reviews_product_id_id", "product_id", "id"),
+        Index("ix_reviews_product_id_rating_id", "product_id", "rating", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -148,3 +201,59 @@ class Review(Base):
     # Relationships
     user = relationship("User", back_populates="reviews")
     product = relationship("Product", back_populates="reviews")
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "product_id", name="uq_stock_reservations_user_product"),
+        # Summing a product's unexpired holds, on every availability check
+        Index("ix_stock_reservations_product_id_expires_at", "product_id", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    product = relationship("Product", back_populates="reservations")
+
+
+# Analytics rollups, maintained incrementally by rollups.py and reconciled
+# periodically against orders. Days are the order's creation date.
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollups"
+    
+    day = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    completed_orders = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)  # Completed payments only
+
+class ProductSalesRollup(Base):
+    __tablename__ = "product_sales_rollups"
+    
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0)  # Completed payments only
+    revenue = Column(Float, nullable=False, default=0)
+
+# Stripe events as received, processed asynchronously by webhook_worker.py.
+# The unique event id makes redelivered events no-ops.
+class WebhookEvent(Base):
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        Index("ix_webhook_events_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stripe_event_id = Column(String, unique=True, nullable=False)
+    event_type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # The verified request body
+    status = Column(Enum(WebhookEventStatus), nullable=False, default=WebhookEventStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True))
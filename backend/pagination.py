@@ -0,0 +1,89 @@
+from fastapi import HTTPException
+from sqlalchemy import DateTime, String, literal, tuple_
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import base64
+import json
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of the last row into an opaque cursor."""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[Any], Any]]) -> List[Any]:
+    """Decode a cursor produced by encode_cursor, parsing each value in turn."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("cursor shape mismatch")
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+class _StoredDateTime(TypeDecorator):
+    """A datetime bound in the format the column holds it.
+    
+    SQLite keeps datetimes as text and compares them as strings. Rows get
+    CURRENT_TIMESTAMP's "YYYY-MM-DD HH:MM:SS", while a bound DateTime would
+    render as "... HH:MM:SS.000000" and sort after every row of that second.
+    """
+    
+    impl = DateTime
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime(timezone=True))
+    
+    def process_bind_param(self, value, dialect):
+        if dialect.name != "sqlite" or value is None:
+            return value
+        stored = value.strftime("%Y-%m-%d %H:%M:%S")
+        return f"{stored}.{value.microsecond:06d}" if value.microsecond else stored
+
+def _bound(column, value):
+    if isinstance(column.type, DateTime):
+        return literal(value, _StoredDateTime())
+    return literal(value, column.type)
+
+def keyset_filter(columns: Sequence[Any], values: Sequence[Any], descending: bool = False):
+    """Filter rows that come strictly after ``values`` in (columns) order."""
+    bound = tuple_(*[_bound(column, value) for column, value in zip(columns, values)])
+    if descending:
+        return tuple_(*columns) < bound
+    return tuple_(*columns) > bound
+
+def keyset_order(columns: Sequence[Any], descending: bool = False) -> List[Any]:
+    """Order clauses matching keyset_filter."""
+    return [column.desc() if descending else column.asc() for column in columns]
+
+async def fetch_page(
+    db: AsyncSession,
+    query,
+    key_columns: Sequence[Any],
+    parsers: Sequence[Callable[[Any], Any]],
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False
+) -> Tuple[List[Any], Optional[str]]:
+    """Fetch one keyset page of ORM objects and the cursor of the page after it."""
+    if cursor is not None:
+        query = query.where(keyset_filter(key_columns, decode_cursor(cursor, parsers), descending))
+    rows = (await db.scalars(
+        query.order_by(*keyset_order(key_columns, descending)).limit(limit + 1)
+    )).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+    return rows, next_cursor
@@ -0,0 +1,140 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+import asyncio
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Payment gateway configuration
+# PAYMENT_GATEWAY selects the implementation: "stripe" calls the Stripe API,
+# "fake" creates intents locally for tests, demos and load tests.
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "stripe")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3"))
+STRIPE_MAX_CONNECTIONS = int(os.getenv("STRIPE_MAX_CONNECTIONS", "20"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+# Simulated round trip of the fake gateway, in seconds
+FAKE_PAYMENT_LATENCY = float(os.getenv("FAKE_PAYMENT_LATENCY", "0"))
+
+class PaymentError(Exception):
+    """The gateway declined or could not complete a request."""
+
+class PaymentIntent:
+    """The parts of a created payment intent the checkout needs."""
+    
+    def __init__(self, id: str, client_secret: str):
+        self.id = id
+        self.client_secret = client_secret
+
+class PaymentGateway(ABC):
+    """Interface of the payment providers the store can use."""
+    
+    @abstractmethod
+    async def create_payment_intent(
+        self,
+        order_id: int,
+        amount: int,
+        currency: str = "usd",
+        metadata: Optional[Dict[str, str]] = None
+    ) -> PaymentIntent:
+        """Create an intent to charge ``amount`` (in cents) for an order.
+        
+        Calls for the same order are idempotent, so a retried checkout gets
+        the intent created the first time.
+        """
+    
+    async def close(self):
+        pass
+
+class StripeGateway(PaymentGateway):
+    """Stripe REST API over one pooled, keep-alive async HTTP client."""
+    
+    def __init__(
+        self,
+        api_key: str = STRIPE_SECRET_KEY,
+        base_url: str = STRIPE_API_BASE,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        # Connection errors are retried by the transport; that is safe because
+        # every request carries an idempotency key
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                retries=STRIPE_MAX_RETRIES,
+                limits=httpx.Limits(max_connections=STRIPE_MAX_CONNECTIONS, max_keepalive_connections=STRIPE_MAX_CONNECTIONS)
+            )
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(api_key, ""),
+            timeout=httpx.Timeout(STRIPE_TIMEOUT, connect=STRIPE_CONNECT_TIMEOUT),
+            transport=transport
+        )
+    
+    async def _post(self, path: str, data: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+        try:
+            response = await self.client.post(path, data=data, headers={"Idempotency-Key": idempotency_key})
+        except httpx.HTTPError as e:
+            raise PaymentError(f"Could not reach Stripe: {e}") from e
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.is_error:
+            raise PaymentError(body.get("error", {}).get("message", f"Stripe returned {response.status_code}"))
+        return body
+    
+    async def create_payment_intent(
+        self,
+        order_id: int,
+        amount: int,
+        currency: str = "usd",
+        metadata: Optional[Dict[str, str]] = None
+    ) -> PaymentIntent:
+        data = {"amount": amount, "currency": currency}
+        for key, value in (metadata or {}).items():
+            data[f"metadata[{key}]"] = value
+        intent = await self._post("/v1/payment_intents", data, f"order-{order_id}-payment-intent")
+        return PaymentIntent(intent["id"], intent["client_secret"])
+    
+    async def close(self):
+        await self.client.aclose()
+
+class FakeGateway(PaymentGateway):
+    """In-memory gateway that never leaves the process."""
+    
+    def __init__(self, latency: float = FAKE_PAYMENT_LATENCY):
+        self.latency = latency
+        self.intents: Dict[int, Dict[str, Any]] = {}
+    
+    async def create_payment_intent(
+        self,
+        order_id: int,
+        amount: int,
+        currency: str = "usd",
+        metadata: Optional[Dict[str, str]] = None
+    ) -> PaymentIntent:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if amount < 1:
+            raise PaymentError("Amount must be at least 1")
+        intent = self.intents.setdefault(order_id, {
+            "id": f"pi_fake_{order_id}",
+            "client_secret": f"pi_fake_{order_id}_secret",
+            "amount": amount,
+            "currency": currency,
+            "metadata": dict(metadata or {}),
+        })
+        return PaymentIntent(intent["id"], intent["client_secret"])
+
+def create_payment_gateway(name: str = PAYMENT_GATEWAY) -> PaymentGateway:
+    """Build the gateway selected by PAYMENT_GATEWAY."""
+    if name == "fake":
+        return FakeGateway()
+    if name == "stripe":
+        return StripeGateway()
+    raise RuntimeError(f"Unknown PAYMENT_GATEWAY: {name}")
+
+payment_gateway = create_payment_gateway()
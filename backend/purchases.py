@@ -0,0 +1,55 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, upsert
+from models import Order, OrderItem, ProductPurchase
+
+load_dotenv()
+
+# Reject reviews from users who have not paid for the product, instead of
+# accepting them without the verified-purchase mark
+REVIEWS_REQUIRE_PURCHASE = os.getenv("REVIEWS_REQUIRE_PURCHASE", "false").lower() == "true"
+
+PURCHASE_COLUMNS = ["user_id", "product_id", "first_order_id"]
+
+async def _insert_purchases(db: AsyncSession, source):
+    await db.execute(
+        upsert(db, ProductPurchase)
+        .from_select(PURCHASE_COLUMNS, source)
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+    )
+
+async def record_purchases(db: AsyncSession, order_id: int):
+    """Add a newly paid order's products to its user's purchases. Does not commit."""
+    await _insert_purchases(
+        db,
+        select(Order.user_id, OrderItem.product_id, literal(order_id))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(OrderItem.order_id == order_id)
+        .distinct()
+    )
+
+async def has_purchased(db: AsyncSession, user_id: int, product_id: int) -> bool:
+    """Whether the user has paid for the product, by primary key."""
+    return await db.get(ProductPurchase, (user_id, product_id)) is not None
+
+async def backfill_purchases(db: AsyncSession):
+    """Record every paid order's products in one INSERT ... SELECT and commit."""
+    await _insert_purchases(
+        db,
+        select(Order.user_id, OrderItem.product_id, func.min(Order.id))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(Order.payment_status == "completed")
+        .group_by(Order.user_id, OrderItem.product_id)
+    )
+    await db.commit()
+
+if __name__ == "__main__":
+    async def main():
+        async with AsyncSessionLocal() as db:
+            await backfill_purchases(db)
+    
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from typing import Dict, List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class QueryCounter:
+    """Statements executed while a count_queries() block is active."""
+    
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+
+# Counters are process-wide so that statements issued by the app's event loop
+# thread (e.g. behind a TestClient) are seen by the test that opened the block.
+_active_counters: List[QueryCounter] = []
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters:
+        counter.count += 1
+        counter.statements.append(statement)
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block."""
+    counter = QueryCounter()
+    _active_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _active_counters.remove(counter)
+
+def assert_constant_query_count(counts: Dict[int, int]):
+    """Fail if the query count for an endpoint grows with its result size.
+    
+    ``counts`` maps the number of rows an endpoint returned to the number of
+    statements it issued, e.g. ``{1: count_for_one_order, 50: count_for_fifty}``.
+    """
+    if len(set(counts.values())) > 1:
+        detail = ", ".join(f"{rows} rows: {queries} queries" for rows, queries in sorted(counts.items()))
+        raise AssertionError(f"Query count grows with result size (N+1 query?): {detail}")
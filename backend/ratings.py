@@ -0,0 +1,79 @@
+from typing import Optional, Sequence
+import argparse
+import asyncio
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Product, Review
+
+STARS = range(1, 6)
+
+async def add_rating(db: AsyncSession, product_id: int, rating: int):
+    """Count a new review's rating on its product, in the caller's transaction.
+    
+    A single UPDATE reads and writes the aggregates under the row lock, so
+    concurrent reviews of one product cannot lose each other's counts.
+    """
+    await db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values({
+            Product.reviews_count: Product.reviews_count + 1,
+            Product.rating_sum: Product.rating_sum + rating,
+            Product.rating_average: cast(Product.rating_sum + rating, Float) / (Product.reviews_count + 1),
+            getattr(Product, f"rating_{rating}_count"): getattr(Product, f"rating_{rating}_count") + 1,
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+async def change_rating(db: AsyncSession, product_id: int, old_rating: int, new_rating: int):
+    """Move an edited review's rating on its product, in the caller's transaction."""
+    if old_rating == new_rating:
+        return
+    rating_sum = Product.rating_sum + new_rating - old_rating
+    await db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values({
+            Product.rating_sum: rating_sum,
+            Product.rating_average: cast(rating_sum, Float) / Product.reviews_count,
+            getattr(Product, f"rating_{old_rating}_count"): getattr(Product, f"rating_{old_rating}_count") - 1,
+            getattr(Product, f"rating_{new_rating}_count"): getattr(Product, f"rating_{new_rating}_count") + 1,
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+async def reconcile_ratings(db: AsyncSession, product_ids: Optional[Sequence[int]] = None):
+    """Recompute the review aggregates of products (default: all) from reviews."""
+    of_product = Review.product_id == Product.id
+    
+    def aggregate(value):
+        return select(func.coalesce(func.sum(value), 0)).where(of_product).scalar_subquery()
+    
+    values = {
+        Product.reviews_count: select(func.count()).where(of_product).scalar_subquery(),
+        Product.rating_sum: aggregate(Review.rating),
+        Product.rating_average: (
+            select(func.coalesce(func.avg(cast(Review.rating, Float)), 0)).where(of_product).scalar_subquery()
+        ),
+    }
+    for stars in STARS:
+        values[getattr(Product, f"rating_{stars}_count")] = aggregate(case((Review.rating == stars, 1), else_=0))
+    
+    stmt = update(Product).values(values).execution_options(synchronize_session=False)
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(list(product_ids)))
+    await db.execute(stmt)
+    await db.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild product rating aggregates from the reviews table.")
+    parser.add_argument("product_ids", nargs="*", type=int, help="Products to rebuild (default: all)")
+    args = parser.parse_args()
+    
+    async def main():
+        async with AsyncSessionLocal() as db:
+            await reconcile_ratings(db, args.product_ids or None)
+    
+    asyncio.run(main())
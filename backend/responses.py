@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+# Content codings CompressionMiddleware may apply. It appends "-<coding>" to
+# the ETag of a compressed response, so a strong tag names one representation.
+CONTENT_CODINGS = ("br", "gzip")
+
+def model_response(model: BaseModel, status_code: int = 200) -> Response:
+    """Serialize an already validated model straight to JSON.
+    
+    Returning a Response skips FastAPI's response_model revalidation and
+    jsonable_encoder pass; the route's response_model still documents the
+    schema. Use it only for instances of the declared response model.
+    """
+    return Response(model.model_dump_json(), status_code=status_code, media_type="application/json")
+
+def cache_headers(etag: str, max_age: int, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """Validator and Cache-Control headers for a publicly cacheable response."""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def _matching_etag(if_none_match: str, etag: str) -> Optional[str]:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        tag = candidate.removeprefix("W/")
+        for coding in CONTENT_CODINGS:
+            if tag.endswith(f'-{coding}"'):
+                tag = tag[:-len(coding) - 2] + '"'
+                break
+        if tag == etag:
+            return candidate
+    return None
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> Optional[str]:
+    """The validator of the client's copy if it is current, else None.
+    
+    If-None-Match is checked when present, If-Modified-Since otherwise. The
+    returned tag is the one the client sent, coding suffix included, so a
+    304 names the representation the client (or a CDN) actually stored.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _matching_etag(if_none_match, etag)
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return None
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return None
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second resolution
+    return etag if last_modified.replace(microsecond=0) <= since else None
+
+def not_modified_response(headers: Dict[str, str], etag: str) -> Response:
+    """Bodyless 304 with the full response's headers and the client's validator.
+    
+    A 304 carries no content type, so CompressionMiddleware leaves it alone;
+    Vary is added here to match the 200 a cache would be freshening.
+    """
+    return Response(status_code=304, headers={**headers, "ETag": etag, "Vary": "Accept-Encoding"})
@@ -0,0 +1,180 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Sequence
+import argparse
+import asyncio
+import os
+from dotenv import load_dotenv
+from sqlalchemy import case, delete, func, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, upsert
+from models import DailySalesRollup, Order, OrderItem, ProductSalesRollup
+
+load_dotenv()
+
+# The reconcile job recomputes this many trailing days from the orders table,
+# correcting drift in the incremental counters (e.g. a checkout that raced a
+# reconcile). Older days are only rebuilt on demand: after editing old orders
+# by hand, run `python rollups.py --since <first day>`.
+ROLLUP_RECONCILE_DAYS = int(os.getenv("ROLLUP_RECONCILE_DAYS", "2"))
+ROLLUP_RECONCILE_INTERVAL = int(os.getenv("ROLLUP_RECONCILE_INTERVAL", "3600"))
+# Arbitrary key for the PostgreSQL advisory lock held while reconciling, so
+# only one worker at a time rebuilds the rollups
+ROLLUP_LOCK_ID = 7210349
+
+DAILY_COLUMNS = ["day", "orders_count", "completed_orders", "revenue"]
+PRODUCT_COLUMNS = ["day", "product_id", "units_sold", "revenue"]
+
+order_day = func.date(Order.created_at)
+
+def _if_paid(value):
+    return case((Order.payment_status == "completed", value), else_=0)
+
+async def _accumulate(db: AsyncSession, model, columns: Sequence[str], keys: Sequence[str], source):
+    """Add the rows of ``source`` onto ``model``, inserting missing keys."""
+    stmt = upsert(db, model).from_select(columns, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            column: getattr(model, column) + getattr(stmt.excluded, column)
+            for column in columns if column not in keys
+        }
+    )
+    await db.execute(stmt)
+
+async def record_order_created(db: AsyncSession, order_id: int):
+    """Count a newly created (flushed) order in its day's rollup. Does not commit."""
+    await _accumulate(
+        db, DailySalesRollup, DAILY_COLUMNS, ["day"],
+        select(order_day, literal(1), literal(0), literal(0.0)).where(Order.id == order_id)
+    )
+
+async def record_payment_completed(db: AsyncSession, order_id: int):
+    """Add a newly paid order's revenue and units to the rollups. Does not commit."""
+    await _accumulate(
+        db, DailySalesRollup, DAILY_COLUMNS, ["day"],
+        select(order_day, literal(0), literal(1), Order.total_amount).where(Order.id == order_id)
+    )
+    await _accumulate(
+        db, ProductSalesRollup, PRODUCT_COLUMNS, ["day", "product_id"],
+        select(
+            order_day,
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.price)
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(OrderItem.order_id == order_id)
+        .group_by(order_day, OrderItem.product_id)
+    )
+
+async def record_payment_reversed(db: AsyncSession, order_id: int):
+    """Take a paid order that is no longer paid back out of the rollups. Does not commit."""
+    await _accumulate(
+        db, DailySalesRollup, DAILY_COLUMNS, ["day"],
+        select(order_day, literal(0), literal(-1), -Order.total_amount).where(Order.id == order_id)
+    )
+    await _accumulate(
+        db, ProductSalesRollup, PRODUCT_COLUMNS, ["day", "product_id"],
+        select(
+            order_day,
+            OrderItem.product_id,
+            -func.sum(OrderItem.quantity),
+            -func.sum(OrderItem.quantity * OrderItem.price)
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(OrderItem.order_id == order_id)
+        .group_by(order_day, OrderItem.product_id)
+    )
+
+async def _lock_rollups(db: AsyncSession, wait: bool) -> bool:
+    """Take the reconcile lock for the current transaction; False if busy and not waiting."""
+    if db.bind.dialect.name != "postgresql":
+        return True
+    if wait:
+        await db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID})
+        return True
+    return bool(await db.scalar(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID}))
+
+async def _replace(db: AsyncSession, model, columns: Sequence[str], keys: Sequence[str], source):
+    """Write the rows of ``source`` onto ``model``, overwriting existing keys.
+    
+    A checkout may insert a key after the reconcile has cleared it; this
+    overwrites that row instead of failing on the primary key.
+    """
+    stmt = upsert(db, model).from_select(columns, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: getattr(stmt.excluded, column) for column in columns if column not in keys}
+    )
+    await db.execute(stmt)
+
+async def _rebuild_rollups(db: AsyncSession, since: Optional[date]):
+    daily = select(
+        order_day,
+        func.count(Order.id),
+        func.sum(_if_paid(1)),
+        func.sum(_if_paid(Order.total_amount))
+    )
+    products = (
+        select(
+            order_day,
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.quantity * OrderItem.price)
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(Order.payment_status == "completed")
+    )
+    clear_daily = delete(DailySalesRollup)
+    clear_products = delete(ProductSalesRollup)
+    if since is not None:
+        start = datetime.combine(since, time.min)
+        daily = daily.where(Order.created_at >= start)
+        products = products.where(Order.created_at >= start)
+        clear_daily = clear_daily.where(DailySalesRollup.day >= since)
+        clear_products = clear_products.where(ProductSalesRollup.day >= since)
+    
+    await db.execute(clear_daily)
+    await db.execute(clear_products)
+    await _replace(db, DailySalesRollup, DAILY_COLUMNS, ["day"], daily.group_by(order_day))
+    await _replace(
+        db, ProductSalesRollup, PRODUCT_COLUMNS, ["day", "product_id"],
+        products.group_by(order_day, OrderItem.product_id)
+    )
+
+async def reconcile_rollups(db: AsyncSession, since: Optional[date] = None):
+    """Recompute rollup rows from ``since`` onwards (everything if None) and commit.
+    
+    Waits for any reconcile already running in another process.
+    """
+    await _lock_rollups(db, wait=True)
+    await _rebuild_rollups(db, since)
+    await db.commit()
+
+async def reconcile_recent_rollups():
+    """Reconcile the trailing ROLLUP_RECONCILE_DAYS; backfill everything on first run.
+    
+    Every worker schedules this, but only one runs it at a time: the others
+    find the lock taken and skip the round.
+    """
+    async with AsyncSessionLocal() as db:
+        if not await _lock_rollups(db, wait=False):
+            await db.rollback()
+            return
+        # Checked under the lock, so a backfill that just finished elsewhere is seen
+        has_rollups = await db.scalar(select(DailySalesRollup.day).limit(1)) is not None
+        since = date.today() - timedelta(days=ROLLUP_RECONCILE_DAYS) if has_rollups else None
+        await _rebuild_rollups(db, since)
+        await db.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild analytics rollups from the orders table.")
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to rebuild (default: all)")
+    args = parser.parse_args()
+    
+    async def main():
+        async with AsyncSessionLocal() as db:
+            await reconcile_rollups(db, args.since)
+    
+    asyncio.run(main())
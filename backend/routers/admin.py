@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List
-from database import get_db
-from models import User, Product, Order, OrderItem, Category
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, desc, select, true
+from typing import Optional
+from database import get_async_db
+from models import User, Product, Order, Category, DailySalesRollup, ProductSalesRollup
 from schemas import (
     UserResponse, 
     ProductCreate, 
@@ -11,61 +11,113 @@ from schemas import (
     ProductResponse,
     CategoryCreate, 
     CategoryUpdate,
-    OrderResponse
+    OrderResponse,
+    PaginatedResponse
 )
-from auth import get_admin_user
-from datetime import datetime, timedelta
+from auth import get_admin_user, invalidate_user
+from catalog import products_changed, categories_changed
+from loaders import PRODUCT_RESPONSE, ORDER_RESPONSE, USER_RESPONSE
+from pagination import fetch_page
+from export import export_response
+from responses import model_response
+from datetime import date, timedelta
 
 router = APIRouter()
 
+EXPORT_FORMAT_PATTERN = r"^(ndjson|csv)$"
+
+USER_EXPORT_COLUMNS = ["id", "email", "username", "first_name", "last_name", "role", "is_active", "created_at"]
+PRODUCT_EXPORT_COLUMNS = ["id", "name", "price", "stock_quantity", "category_id", "is_active", "created_at", "updated_at"]
+ORDER_EXPORT_COLUMNS = ["id", "total_amount", "status", "payment_status", "shipping_address", "billing_address", "created_at", "updated_at"]
+
 # User management
-@router.get("/users", response_model=List[UserResponse])
+@router.get("/users", response_model=PaginatedResponse[UserResponse])
 async def get_all_users(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get users a page at a time, oldest first (admin only)."""
+    users, next_cursor = await fetch_page(
+        db, select(User).options(*USER_RESPONSE), [User.id], [int], cursor, limit
+    )
+    return model_response(PaginatedResponse[UserResponse](
+        items=[UserResponse.model_validate(user) for user in users],
+        limit=limit,
+        next_cursor=next_cursor
+    ))
+
+@router.get("/users/export")
+async def export_users(
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    current_user: User = Depends(get_admin_user)
 ):
-    """Get all users (admin only)."""
-    users = db.query(User).all()
-    return users
+    """Stream every user as NDJSON or CSV (admin only)."""
+    return export_response(
+        select(User).options(*USER_RESPONSE).order_by(User.id),
+        UserResponse, USER_EXPORT_COLUMNS, export_format, "users"
+    )
 
 @router.put("/users/{user_id}/toggle-active")
 async def toggle_user_active(
     user_id: int,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Toggle user active status (admin only)."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.is_active = not user.is_active
-    db.commit()
+    await db.commit()
+    await invalidate_user(user.username)
     
     return {"message": f"User {'activated' if user.is_active else 'deactivated'}"}
 
 # Product management
-@router.get("/products", response_model=List[ProductResponse])
+@router.get("/products", response_model=PaginatedResponse[ProductResponse])
 async def get_all_products_admin(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get products, including inactive ones, a page at a time (admin only)."""
+    products, next_cursor = await fetch_page(
+        db, select(Product).options(*PRODUCT_RESPONSE), [Product.id], [int], cursor, limit
+    )
+    return model_response(PaginatedResponse[ProductResponse](
+        items=[ProductResponse.model_validate(product) for product in products],
+        limit=limit,
+        next_cursor=next_cursor
+    ))
+
+@router.get("/products/export")
+async def export_products(
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    current_user: User = Depends(get_admin_user)
 ):
-    """Get all products (admin only)."""
-    products = db.query(Product).all()
-    return products
+    """Stream every product as NDJSON or CSV (admin only)."""
+    return export_response(
+        select(Product).options(*PRODUCT_RESPONSE).order_by(Product.id),
+        ProductResponse, PRODUCT_EXPORT_COLUMNS, export_format, "products"
+    )
 
 @router.post("/products", response_model=ProductCreate)
 async def create_product_admin(
     product: ProductCreate,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new product (admin only)."""
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await products_changed()
+    await db.refresh(db_product)
     return db_product
 
 @router.put("/products/{product_id}")
@@ -73,10 +125,10 @@ async def update_product_admin(
     product_id: int,
     product_update: ProductUpdate,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a product (admin only)."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -85,25 +137,27 @@ async def update_product_admin(
     for field, value in update_data.items():
         setattr(product, field, value)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await products_changed(product_id)
+    await db.refresh(product)
     return product
 
 @router.delete("/products/{product_id}")
 async def delete_product_admin(
     product_id: int,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a product (admin only)."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Soft delete
     product.is_active = False
-    db.commit()
+    await db.commit()
+    await products_changed(product_id)
     
     return {"message": "Product deleted successfully"}
 
@@ -112,13 +166,14 @@ async def delete_product_admin(
 async def create_category_admin(
     category: CategoryCreate,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new category (admin only)."""
     db_category = Category(**category.dict())
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await categories_changed()
+    await db.refresh(db_category)
     return db_category
 
 @router.put("/categories/{category_id}")
@@ -126,10 +181,10 @@ async def update_category_admin(
     category_id: int,
     category_update: CategoryUpdate,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a category (admin only)."""
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -138,24 +193,27 @@ async def update_category_admin(
     for field, value in update_data.items():
         setattr(category, field, value)
     
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await categories_changed()
+    await db.refresh(category)
     return category
 
 @router.delete("/categories/{category_id}")
 async def delete_category_admin(
     category_id: int,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a category (admin only)."""
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Check if category has products
-    products_count = db.query(Product).filter(Product.category_id == category_id).count()
+    products_count = await db.scalar(
+        select(func.count()).select_from(Product).where(Product.category_id == category_id)
+    )
     if products_count > 0:
         raise HTTPException(
             status_code=400, 
@@ -163,29 +221,51 @@ async def delete_category_admin(
         )
     
     category.is_active = False
-    db.commit()
+    await db.commit()
+    await categories_changed()
     
     return {"message": "Category deleted successfully"}
 
 # Order management
-@router.get("/orders", response_model=List[OrderResponse])
+@router.get("/orders", response_model=PaginatedResponse[OrderResponse])
 async def get_all_orders_admin(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all orders (admin only)."""
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
-    return orders
+    """Get orders a page at a time, newest first (admin only)."""
+    # Ids are assigned in creation order, so paging on the primary key gives
+    # the same newest-first order as created_at without a second sort column
+    orders, next_cursor = await fetch_page(
+        db, select(Order).options(*ORDER_RESPONSE), [Order.id], [int], cursor, limit, descending=True
+    )
+    return model_response(PaginatedResponse[OrderResponse](
+        items=[OrderResponse.model_validate(order) for order in orders],
+        limit=limit,
+        next_cursor=next_cursor
+    ))
+
+@router.get("/orders/export")
+async def export_orders(
+    export_format: str = Query("ndjson", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    current_user: User = Depends(get_admin_user)
+):
+    """Stream every order as NDJSON (with items) or CSV (order totals only) (admin only)."""
+    return export_response(
+        select(Order).options(*ORDER_RESPONSE).order_by(Order.id.desc()),
+        OrderResponse, ORDER_EXPORT_COLUMNS, export_format, "orders"
+    )
 
 @router.put("/orders/{order_id}/status")
 async def update_order_status(
     order_id: int,
     status: str,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update order status (admin only)."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -198,38 +278,51 @@ async def update_order_status(
         )
     
     order.status = status
-    db.commit()
+    await db.commit()
     
     return {"message": f"Order status updated to {status}"}
 
 # Analytics
+def _day_range(column, date_from: Optional[date], date_to: Optional[date]):
+    """Conditions restricting a rollup day column to [date_from, date_to]."""
+    conditions = []
+    if date_from is not None:
+        conditions.append(column >= date_from)
+    if date_to is not None:
+        conditions.append(column <= date_to)
+    return and_(true(), *conditions)
+
 @router.get("/analytics/overview")
 async def get_analytics_overview(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get analytics overview (admin only)."""
-    # Total users
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
+    """Get analytics overview, with order totals read from the daily rollups (admin only)."""
+    # User and product counts
+    counts = (await db.execute(select(
+        select(func.count()).select_from(User).scalar_subquery(),
+        select(func.count()).select_from(User).where(User.is_active == True).scalar_subquery(),
+        select(func.count()).select_from(Product).scalar_subquery(),
+        select(func.count()).select_from(Product).where(Product.is_active == True).scalar_subquery()
+    ))).one()
+    total_users, active_users, total_products, active_products = counts
     
-    # Total products
-    total_products = db.query(Product).count()
-    active_products = db.query(Product).filter(Product.is_active == True).count()
-    
-    # Total orders
-    total_orders = db.query(Order).count()
-    
-    # Revenue
-    total_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.payment_status == "completed"
-    ).scalar() or 0
+    # Orders and revenue in the requested range
+    total_orders, total_revenue = (await db.execute(
+        select(
+            func.coalesce(func.sum(DailySalesRollup.orders_count), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0)
+        ).where(_day_range(DailySalesRollup.day, date_from, date_to))
+    )).one()
     
     # Recent orders (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_orders = db.query(Order).filter(
-        Order.created_at >= thirty_days_ago
-    ).count()
+    thirty_days_ago = date.today() - timedelta(days=30)
+    recent_orders = await db.scalar(
+        select(func.coalesce(func.sum(DailySalesRollup.orders_count), 0))
+        .where(DailySalesRollup.day >= thirty_days_ago)
+    )
     
     return {
         "users": {
@@ -246,27 +339,33 @@ async def get_analytics_overview(
         },
         "revenue": {
             "total": float(total_revenue)
+        },
+        "range": {
+            "from": date_from,
+            "to": date_to
         }
     }
 
 @router.get("/analytics/top-products")
 async def get_top_products(
     limit: int = 10,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get top-selling products (admin only)."""
-    top_products = db.query(
-        Product.name,
-        func.sum(OrderItem.quantity).label('total_sold'),
-        func.sum(OrderItem.quantity * OrderItem.price).label('total_revenue')
-    ).join(OrderItem, Product.id == OrderItem.product_id)\
-     .join(Order, OrderItem.order_id == Order.id)\
-     .filter(Order.payment_status == "completed")\
-     .group_by(Product.id, Product.name)\
-     .order_by(desc('total_sold'))\
-     .limit(limit)\
-     .all()
+    """Get top-selling products from the per-product daily rollups (admin only)."""
+    top_products = (await db.execute(
+        select(
+            Product.name,
+            func.sum(ProductSalesRollup.units_sold).label('total_sold'),
+            func.sum(ProductSalesRollup.revenue).label('total_revenue')
+        ).join(ProductSalesRollup, Product.id == ProductSalesRollup.product_id)
+         .where(_day_range(ProductSalesRollup.day, date_from, date_to))
+         .group_by(Product.id, Product.name)
+         .order_by(desc('total_sold'))
+         .limit(limit)
+    )).all()
     
     return [
         {
@@ -1,27 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User
 from schemas import UserCreate, UserResponse, Token, UserUpdate
 from auth import (
-    verify_password, 
-    get_password_hash, 
+    hash_password,
+    verify_and_update_password,
     create_access_token, 
-    get_current_active_user,
+    token_claims,
+    invalidate_user,
+    get_current_active_profile,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from guest_cart import GUEST_CART_COOKIE, cart_id_from_token, merge_into_user_cart
 from datetime import timedelta
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     # Check if user already exists
-    db_user = db.query(User).filter(
+    db_user = await db.scalar(select(User).where(
         (User.email == user.email) | (User.username == user.username)
-    ).first()
+    ))
     
     if db_user:
         raise HTTPException(
@@ -30,7 +34,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -40,17 +44,26 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """Login and get access token."""
-    user = db.query(User).filter(User.username == form_data.username).first()
+async def login(
+    request: Request,
+    response: Response,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Login and get access token, moving any guest cart into the user's cart."""
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+    
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -63,34 +76,48 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
             detail="Inactive user"
         )
     
+    if new_hash:
+        # Stored hash used an outdated bcrypt cost; upgrade it now that we know the password
+        user.hashed_password = new_hash
+        await db.commit()
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
+    # Done last: a failed merge rolls the session back, expiring ``user``
+    guest_id = cart_id_from_token(request.cookies.get(GUEST_CART_COOKIE))
+    if guest_id is not None:
+        await merge_into_user_cart(db, user.id, guest_id)
+        response.delete_cookie(GUEST_CART_COOKIE)
+    
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_active_profile)):
     """Get current user information."""
     return current_user
 
 @router.put("/me", response_model=UserResponse)
 async def update_user_me(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_profile),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user information."""
+    # The authenticated user may come from the principal cache, detached from this session
+    user = await db.get(User, current_user.id)
     update_data = user_update.dict(exclude_unset=True)
     
     for field, value in update_data.items():
-        setattr(current_user, field, value)
+        setattr(user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    await invalidate_user(user.username)
     
-    return current_user
+    return user
 
 @router.post("/logout")
 async def logout():
@@ -1,146 +1,230 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List
-from database import get_db
-from models import CartItem, Product, User
-from schemas import CartItemCreate, CartItemResponse, CartItemUpdate
-from auth import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, delete, func
+from typing import Iterable, List, Optional
+from database import get_async_db
+from models import CartItem, User
+from schemas import CartBatchUpdate, CartItemCreate, CartItemResponse, CartItemUpdate, CartSummary
+from auth import get_optional_active_user
+from loaders import CART_ITEM_RESPONSE
+from inventory import hold_stock, release_holds
+from carts import cart_changed, cart_summary, upsert_cart_items
+import guest_cart
+from guest_cart import GUEST_CART_COOKIE, GUEST_CART_COOKIE_SECURE, GUEST_CART_TTL
 
 router = APIRouter()
 
+class CartOwner:
+    """The cart a request acts on: a signed-in user's, or a guest's (by cart id)."""
+    
+    def __init__(self, user: Optional[User] = None, guest_id: Optional[str] = None):
+        self.user = user
+        self.guest_id = guest_id
+
+async def get_cart_owner(
+    request: Request,
+    response: Response,
+    current_user: Optional[User] = Depends(get_optional_active_user)
+) -> CartOwner:
+    """Resolve the cart owner, issuing a guest cart cookie to new anonymous visitors."""
+    if current_user is not None:
+        return CartOwner(user=current_user)
+    
+    guest_id = guest_cart.cart_id_from_token(request.cookies.get(GUEST_CART_COOKIE))
+    if guest_id is None:
+        token = guest_cart.new_cart_token()
+        guest_id = guest_cart.cart_id_from_token(token)
+        response.set_cookie(
+            GUEST_CART_COOKIE,
+            token,
+            max_age=GUEST_CART_TTL,
+            httponly=True,
+            samesite="lax",
+            secure=GUEST_CART_COOKIE_SECURE
+        )
+    return CartOwner(guest_id=guest_id)
+
+async def _load_cart_item(db: AsyncSession, item_id: int) -> CartItem:
+    """Load a cart item with the relationships CartItemResponse serializes."""
+    return await db.scalar(
+        select(CartItem)
+        .options(*CART_ITEM_RESPONSE)
+        .where(CartItem.id == item_id)
+        .execution_options(populate_existing=True)
+    )
+
+async def _load_user_cart_items(db: AsyncSession, user_id: int, product_ids: Iterable[int]) -> List[CartItem]:
+    """Load a user's cart items for the given products, for CartItemResponse."""
+    return (await db.scalars(
+        select(CartItem)
+        .options(*CART_ITEM_RESPONSE)
+        .where(and_(CartItem.user_id == user_id, CartItem.product_id.in_(list(product_ids))))
+        .order_by(CartItem.id)
+        .execution_options(populate_existing=True)
+    )).all()
+
 @router.get("/", response_model=List[CartItemResponse])
 async def get_cart(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get current user's cart items."""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
+    """Get the current user's or guest's cart items."""
+    if owner.user is None:
+        return await guest_cart.cart_items(db, owner.guest_id)
+    
+    cart_items = (await db.scalars(
+        select(CartItem)
+        .options(*CART_ITEM_RESPONSE)
+        .where(CartItem.user_id == owner.user.id)
+    )).all()
     return cart_items
 
 @router.post("/add", response_model=CartItemResponse)
 async def add_to_cart(
     cart_item: CartItemCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Add a product to the cart."""
-    # Check if product exists and is active
-    product = db.query(Product).filter(
-        and_(Product.id == cart_item.product_id, Product.is_active == True)
-    ).first()
-    
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Check if product is in stock
-    if product.stock_quantity < cart_item.quantity:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Not enough stock. Available: {product.stock_quantity}"
-        )
+    """Add a product to the cart, holding its stock for RESERVATION_TTL_SECONDS."""
+    quantities = {cart_item.product_id: cart_item.quantity}
+    if owner.user is None:
+        await guest_cart.set_quantities(db, owner.guest_id, quantities)
+        items = await guest_cart.cart_items(db, owner.guest_id, [cart_item.product_id])
+        return items[0]
     
-    # Check if item already exists in cart
-    existing_item = db.query(CartItem).filter(
-        and_(
-            CartItem.user_id == current_user.id,
-            CartItem.product_id == cart_item.product_id
-        )
-    ).first()
-    
-    if existing_item:
-        # Update quantity
-        new_quantity = existing_item.quantity + cart_item.quantity
-        if new_quantity > product.stock_quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Not enough stock. Available: {product.stock_quantity}, Requested: {new_quantity}"
-            )
-        existing_item.quantity = new_quantity
-        db.commit()
-        db.refresh(existing_item)
-        return existing_item
-    else:
-        # Create new cart item
-        db_cart_item = CartItem(
-            user_id=current_user.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity
-        )
-        db.add(db_cart_item)
-        db.commit()
-        db.refresh(db_cart_item)
-        return db_cart_item
+    # Insert or increment the line; raises 404/400 if the product is gone or short
+    await upsert_cart_items(db, owner.user.id, quantities)
+    await db.commit()
+    await cart_changed(owner.user.id)
+    
+    items = await _load_user_cart_items(db, owner.user.id, [cart_item.product_id])
+    return items[0]
+
+@router.post("/batch", response_model=List[CartItemResponse])
+async def add_to_cart_batch(
+    batch: CartBatchUpdate,
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add (or with ``replace``, set) many cart items in one transaction."""
+    quantities = {}
+    for item in batch.items:
+        if batch.replace:
+            quantities[item.product_id] = item.quantity
+        else:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    
+    if owner.user is None:
+        await guest_cart.set_quantities(db, owner.guest_id, quantities, replace=batch.replace)
+        return await guest_cart.cart_items(db, owner.guest_id, list(quantities))
+    
+    await upsert_cart_items(db, owner.user.id, quantities, replace=batch.replace)
+    await db.commit()
+    await cart_changed(owner.user.id)
+    
+    return await _load_user_cart_items(db, owner.user.id, quantities)
 
 @router.put("/{item_id}", response_model=CartItemResponse)
 async def update_cart_item(
     item_id: int,
     cart_item_update: CartItemUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update cart item quantity."""
-    cart_item = db.query(CartItem).filter(
-        and_(
-            CartItem.id == item_id,
-            CartItem.user_id == current_user.id
+    """Update cart item quantity. Guest cart items are identified by product id."""
+    if owner.user is None:
+        if item_id not in await guest_cart.load_lines(owner.guest_id):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        await guest_cart.set_quantities(db, owner.guest_id, {item_id: cart_item_update.quantity}, replace=True)
+        items = await guest_cart.cart_items(db, owner.guest_id, [item_id])
+        return items[0]
+    
+    cart_item = await db.scalar(
+        select(CartItem)
+        .where(
+            and_(
+                CartItem.id == item_id,
+                CartItem.user_id == owner.user.id
+            )
         )
-    ).first()
+    )
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    # Check stock availability
-    if cart_item_update.quantity > cart_item.product.stock_quantity:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Not enough stock. Available: {cart_item.product.stock_quantity}"
-        )
-    
+    await hold_stock(db, owner.user.id, {cart_item.product_id: cart_item_update.quantity})
     cart_item.quantity = cart_item_update.quantity
-    db.commit()
-    db.refresh(cart_item)
+    await db.commit()
+    await cart_changed(owner.user.id)
     
-    return cart_item
+    return await _load_cart_item(db, item_id)
 
 @router.delete("/{item_id}")
 async def remove_from_cart(
     item_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove item from cart."""
-    cart_item = db.query(CartItem).filter(
+    if owner.user is None:
+        if not await guest_cart.remove_line(owner.guest_id, item_id):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        return {"message": "Item removed from cart"}
+    
+    cart_item = await db.scalar(select(CartItem).where(
         and_(
             CartItem.id == item_id,
-            CartItem.user_id == current_user.id
+            CartItem.user_id == owner.user.id
         )
-    ).first()
+    ))
     
     if not cart_item:
         raise HTTPException(status_code=404, detail="Cart item not found")
     
-    db.delete(cart_item)
-    db.commit()
+    await release_holds(db, owner.user.id, [cart_item.product_id])
+    await db.delete(cart_item)
+    await db.commit()
+    await cart_changed(owner.user.id)
     
     return {"message": "Item removed from cart"}
 
 @router.delete("/")
 async def clear_cart(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Clear all items from cart."""
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
-    db.commit()
+    if owner.user is None:
+        await guest_cart.clear(owner.guest_id)
+        return {"message": "Cart cleared"}
+    
+    await release_holds(db, owner.user.id)
+    await db.execute(delete(CartItem).where(CartItem.user_id == owner.user.id))
+    await db.commit()
+    await cart_changed(owner.user.id)
     
     return {"message": "Cart cleared"}
 
+@router.get("/summary", response_model=CartSummary)
+async def get_cart_summary(
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get cart totals and whether each line can still be fulfilled."""
+    if owner.user is None:
+        return await guest_cart.summary(db, owner.guest_id)
+    return await cart_summary(db, owner.user.id)
+
 @router.get("/count")
 async def get_cart_count(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    owner: CartOwner = Depends(get_cart_owner),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get total number of items in cart."""
-    count = db.query(CartItem).filter(CartItem.user_id == current_user.id).count()
+    if owner.user is None:
+        return {"count": len(await guest_cart.load_lines(owner.guest_id))}
+    
+    count = await db.scalar(
+        select(func.count()).select_from(CartItem).where(CartItem.user_id == owner.user.id)
+    )
     return {"count": count}
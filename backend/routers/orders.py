@@ -1,34 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, delete, insert
+from typing import List, Optional
+from database import get_async_db
 from models import Order, OrderItem, CartItem, Product, User
-from schemas import OrderCreate, OrderResponse, OrderUpdate
+from schemas import OrderCreate, OrderResponse, OrderUpdate, PaginatedResponse
 from auth import get_current_active_user, get_admin_user
+from loaders import ORDER_RESPONSE
+from catalog import product_stats_changed
+from carts import cart_changed
+from inventory import available_stock, lock_holds, sell_stock
+from pagination import fetch_page
+from rollups import record_order_created, record_payment_completed, record_payment_reversed
+from purchases import record_purchases
+from responses import model_response
 from datetime import datetime
 
 router = APIRouter()
 
+def _order_query():
+    """Select orders with the relationships OrderResponse serializes."""
+    return select(Order).options(*ORDER_RESPONSE)
+
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user's orders."""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(Order.created_at.desc()).all()
+    orders = (await db.scalars(
+        _order_query().where(Order.user_id == current_user.id).order_by(Order.created_at.desc())
+    )).all()
     return orders
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific order by ID."""
-    order = db.query(Order).filter(
+    order = await db.scalar(_order_query().where(
         and_(Order.id == order_id, Order.user_id == current_user.id)
-    ).first()
+    ))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -39,42 +53,60 @@ async def get_order(
 async def create_order(
     order_data: OrderCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create a new order from cart items."""
-    # Get cart items
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    if not cart_items:
+    """Create a new order from cart items.
+    
+    Runs as a single transaction: the user's stock holds and then the cart's
+    products are locked in id order (so concurrent checkouts cannot deadlock),
+    stock is decremented by one conditional UPDATE that keeps other shoppers'
+    holds covered, the user's holds are released, and order items are
+    inserted in one batch.
+    """
+    await lock_holds(db, current_user.id)
+    cart_rows = (await db.execute(
+        select(CartItem.quantity, Product, available_stock(current_user.id).label("available"))
+        .join(Product, CartItem.product_id == Product.id)
+        .where(CartItem.user_id == current_user.id)
+        .order_by(Product.id)
+        .with_for_update(of=Product)
+    )).all()
+    
+    if not cart_rows:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
     # Calculate total amount
     total_amount = 0
     order_items_data = []
     
-    for cart_item in cart_items:
-        product = cart_item.product
+    for quantity, product, available in cart_rows:
         if not product.is_active:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Product {product.name} is no longer available"
             )
         
-        if product.stock_quantity < cart_item.quantity:
+        if available < quantity:
             raise HTTPException(
                 status_code=400,
-                detail=f"Not enough stock for {product.name}. Available: {product.stock_quantity}"
+                detail=f"Not enough stock for {product.name}. Available: {available}"
             )
         
-        item_total = product.price * cart_item.quantity
+        item_total = product.price * quantity
         total_amount += item_total
         
         order_items_data.append({
             "product_id": product.id,
-            "quantity": cart_item.quantity,
+            "quantity": quantity,
             "price": product.price
         })
     
+    # Decrement stock for every product at once; the guard keeps it from going negative
+    quantities = {item["product_id"]: item["quantity"] for item in order_items_data}
+    if not await sell_stock(db, current_user.id, quantities):
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Stock changed during checkout, please try again")
+    
     # Create order
     order = Order(
         user_id=current_user.id,
@@ -82,42 +114,35 @@ async def create_order(
         shipping_address=order_data.shipping_address,
         billing_address=order_data.billing_address
     )
-    
     db.add(order)
-    db.commit()
-    db.refresh(order)
-    
-    # Create order items and update stock
-    for item_data in order_items_data:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item_data["product_id"],
-            quantity=item_data["quantity"],
-            price=item_data["price"]
-        )
-        db.add(order_item)
-        
-        # Update product stock
-        product = db.query(Product).filter(Product.id == item_data["product_id"]).first()
-        product.stock_quantity -= item_data["quantity"]
+    await db.flush()
+    
+    await db.execute(
+        insert(OrderItem),
+        [{**item_data, "order_id": order.id} for item_data in order_items_data]
+    )
+    await record_order_created(db, order.id)
     
     # Clear cart
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
+    await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await product_stats_changed(*quantities)
+    await cart_changed(current_user.id)
     
-    return order
+    return await db.scalar(
+        _order_query().where(Order.id == order.id).execution_options(populate_existing=True)
+    )
 
 @router.put("/{order_id}", response_model=OrderResponse)
 async def update_order(
     order_id: int,
     order_update: OrderUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update order status (admin only)."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -127,31 +152,52 @@ async def update_order(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     update_data = order_update.dict(exclude_unset=True)
+    if "payment_status" in update_data and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    was_paid = order.payment_status == "completed"
     for field, value in update_data.items():
         setattr(order, field, value)
     
-    db.commit()
-    db.refresh(order)
+    # Keep the rollups and purchases in step, as the payment webhooks do
+    is_paid = order.payment_status == "completed"
+    if is_paid and not was_paid:
+        await record_payment_completed(db, order.id)
+        await record_purchases(db, order.id)
+    elif was_paid and not is_paid:
+        await record_payment_reversed(db, order.id)
     
-    return order
+    await db.commit()
+    
+    return await db.scalar(
+        _order_query().where(Order.id == order_id).execution_options(populate_existing=True)
+    )
 
-@router.get("/admin/all", response_model=List[OrderResponse])
+@router.get("/admin/all", response_model=PaginatedResponse[OrderResponse])
 async def get_all_orders(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all orders (admin only)."""
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
-    return orders
+    """Get orders a page at a time, newest first (admin only)."""
+    orders, next_cursor = await fetch_page(
+        db, _order_query(), [Order.id], [int], cursor, limit, descending=True
+    )
+    return model_response(PaginatedResponse[OrderResponse](
+        items=[OrderResponse.model_validate(order) for order in orders],
+        limit=limit,
+        next_cursor=next_cursor
+    ))
 
 @router.get("/admin/{order_id}", response_model=OrderResponse)
 async def get_order_admin(
     order_id: int,
     current_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get any order by ID (admin only)."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.scalar(_order_query().where(Order.id == order_id))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
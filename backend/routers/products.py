@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, func, text
 from typing import List, Optional
-from database import get_db
+from datetime import datetime
+from database import get_async_db
 from models import Product, Category, Review
 from schemas import (
     ProductResponse, 
@@ -13,97 +15,235 @@ from schemas import (
     ProductSearch,
     PaginatedResponse,
     ReviewResponse,
-    ReviewCreate
+    ReviewCreate,
+    ReviewUpdate
 )
 from auth import get_current_active_user, get_admin_user
 from models import User
+from search import apply_search
+from pagination import encode_cursor, decode_cursor, fetch_page, keyset_filter, keyset_order
+from ratings import add_rating, change_rating
+from responses import cache_headers, is_not_modified, model_response, not_modified_response
+from purchases import REVIEWS_REQUIRE_PURCHASE, has_purchased
+from loaders import PRODUCT_RESPONSE, REVIEW_RESPONSE
+from cache import cache
+from catalog import (
+    CATALOG_CACHE_TTL,
+    CATALOG_HTTP_MAX_AGE,
+    CATALOG_LISTING_TTL,
+    catalog_etag,
+    product_key,
+    product_list_key,
+    category_list_key,
+    products_changed,
+    product_stats_changed,
+    categories_changed
+)
 
 router = APIRouter()
 
+async def _load_product(db: AsyncSession, product_id: int) -> Optional[Product]:
+    """Load a product with the relationships ProductResponse serializes."""
+    return await db.scalar(
+        select(Product)
+        .options(*PRODUCT_RESPONSE)
+        .where(Product.id == product_id)
+        .execution_options(populate_existing=True)
+    )
+
+# Sort keys accepted by the product listing, with the parser for cursor values
+SORT_FIELDS = {
+    "id": (Product.id, int),
+    "price": (Product.price, float),
+    "created_at": (Product.created_at, datetime.fromisoformat),
+    "name": (Product.name, str),
+    "rating": (Product.rating_average, float),
+}
+
+# Review listing orders: (key columns, cursor parsers, descending). Ids grow
+# with creation time, so "newest" pages on the primary key alone.
+REVIEW_SORTS = {
+    "newest": ([Review.id], [int], True),
+    "highest": ([Review.rating, Review.id], [int, int], True),
+    "lowest": ([Review.rating, Review.id], [int, int], False),
+}
+
+async def _estimate_product_count(db: AsyncSession) -> Optional[int]:
+    """Read the planner's row estimate for products instead of counting."""
+    if db.bind.dialect.name != "postgresql":
+        return None
+    estimate = await db.scalar(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'products'")
+    )
+    # reltuples is -1 until the table has been vacuumed or analyzed
+    return estimate if estimate is not None and estimate >= 0 else None
+
 # Product endpoints
-@router.get("/", response_model=PaginatedResponse)
+@router.get("/", response_model=PaginatedResponse[ProductResponse])
 async def get_products(
+    request: Request,
     search: Optional[str] = Query(None),
     category_id: Optional[int] = Query(None),
     min_price: Optional[float] = Query(None),
     max_price: Optional[float] = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    sort: Optional[str] = Query(None, pattern=r"^-?(id|price|created_at|name|rating)$"),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products with search and filtering."""
-    query = db.query(Product).filter(Product.is_active == True)
+    """Get products with search and filtering.
+    
+    Passing ``cursor`` (the ``next_cursor`` of a previous page) switches to
+    keyset pagination, which skips OFFSET and, unless ``include_total`` is set,
+    the total count. Without ``sort``, search results are ranked by relevance;
+    ``sort=-rating`` lists the top-rated products first. The ETag follows the
+    catalog versions, so a revalidation needs no query.
+    """
+    cache_key = await product_list_key({
+        "search": search,
+        "category_id": category_id,
+        "min_price": min_price,
+        "max_price": max_price,
+        "page": page,
+        "limit": limit,
+        "sort": sort,
+        "cursor": cursor,
+        "include_total": include_total,
+    })
+    etag = catalog_etag(cache_key)
+    headers = cache_headers(etag, CATALOG_HTTP_MAX_AGE)
+    matched = is_not_modified(request, etag)
+    if matched is not None:
+        return not_modified_response(headers, matched)
+    
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached, headers=headers)
+    
+    query = select(Product).where(Product.is_active == True)
+    keyset = cursor is not None or sort is not None or not search
     
     # Apply filters
     if search:
-        query = query.filter(
-            or_(
-                Product.name.ilike(f"%{search}%"),
-                Product.description.ilike(f"%{search}%")
-            )
-        )
+        query = await apply_search(db, query, search, rank=not keyset)
     
     if category_id:
-        query = query.filter(Product.category_id == category_id)
+        query = query.where(Product.category_id == category_id)
     
     if min_price is not None:
-        query = query.filter(Product.price >= min_price)
+        query = query.where(Product.price >= min_price)
     
     if max_price is not None:
-        query = query.filter(Product.price <= max_price)
+        query = query.where(Product.price <= max_price)
     
     # Get total count
-    total = query.count()
+    if include_total is None:
+        include_total = cursor is None
+    total = None
+    if include_total:
+        filtered = search or category_id or min_price is not None or max_price is not None
+        if cursor is not None and not filtered:
+            total = await _estimate_product_count(db)
+        if total is None:
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    
+    # Apply ordering and pagination
+    field = (sort or "id").lstrip("-")
+    descending = bool(sort) and sort.startswith("-")
+    sort_column, parse_value = SORT_FIELDS[field]
+    key_columns = [sort_column] if field == "id" else [sort_column, Product.id]
+    parsers = [parse_value] if field == "id" else [parse_value, int]
     
-    # Apply pagination
-    offset = (page - 1) * limit
-    products = query.offset(offset).limit(limit).all()
+    if keyset:
+        query = query.order_by(*keyset_order(key_columns, descending))
+    if cursor is not None:
+        query = query.where(keyset_filter(key_columns, decode_cursor(cursor, parsers), descending))
+    else:
+        query = query.offset((page - 1) * limit)
+    
+    products = (await db.scalars(
+        query.options(*PRODUCT_RESPONSE).limit(limit + 1)
+    )).all()
+    has_more = len(products) > limit
+    products = products[:limit]
+    
+    next_cursor = None
+    if keyset and has_more:
+        last = products[-1]
+        next_cursor = encode_cursor(
+            [getattr(last, column.key) for column in key_columns]
+        )
     
     # Calculate pages
-    pages = (total + limit - 1) // limit
+    pages = (total + limit - 1) // limit if total is not None else None
     
-    return PaginatedResponse(
-        items=[ProductResponse.from_orm(product) for product in products],
+    response = PaginatedResponse[ProductResponse](
+        items=[ProductResponse.model_validate(product) for product in products],
         total=total,
-        page=page,
+        page=page if cursor is None else None,
         limit=limit,
-        pages=pages
-    )
+        pages=pages,
+        next_cursor=next_cursor
+    ).model_dump(mode="json")
+    await cache.set(cache_key, response, CATALOG_LISTING_TTL)
+    
+    # Already validated: return it as is rather than through response_model
+    return ORJSONResponse(response, headers=headers)
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get a single product by ID."""
-    product = db.query(Product).filter(
-        and_(Product.id == product_id, Product.is_active == True)
-    ).first()
+    cache_key = await product_key(product_id)
+    response = await cache.get(cache_key)
+    if response is None:
+        product = await db.scalar(
+            select(Product)
+            .options(*PRODUCT_RESPONSE)
+            .where(and_(Product.id == product_id, Product.is_active == True))
+        )
+        
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        last_modified = product.updated_at or product.created_at
+    else:
+        last_modified = datetime.fromisoformat(response["updated_at"] or response["created_at"])
     
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    # The row version covers the product's columns, the key its category
+    etag = catalog_etag(cache_key, last_modified.isoformat())
+    headers = cache_headers(etag, CATALOG_HTTP_MAX_AGE, last_modified)
+    matched = is_not_modified(request, etag, last_modified)
+    if matched is not None:
+        return not_modified_response(headers, matched)
     
-    return product
+    if response is None:
+        response = ProductResponse.model_validate(product).model_dump(mode="json")
+        await cache.set(cache_key, response, CATALOG_CACHE_TTL)
+    return ORJSONResponse(response, headers=headers)
 
 @router.post("/", response_model=ProductResponse)
 async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_admin_user)
 ):
     """Create a new product (admin only)."""
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+    await db.commit()
+    await products_changed()
+    return await _load_product(db, db_product.id)
 
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
     product_update: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_admin_user)
 ):
     """Update a product (admin only)."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -112,79 +252,117 @@ async def update_product(
     for field, value in update_data.items():
         setattr(product, field, value)
     
-    db.commit()
-    db.refresh(product)
-    return product
+    await db.commit()
+    await products_changed(product_id)
+    return await _load_product(db, product_id)
 
 @router.delete("/{product_id}")
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_admin_user)
 ):
     """Delete a product (admin only)."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Soft delete by setting is_active to False
     product.is_active = False
-    db.commit()
+    await db.commit()
+    await products_changed(product_id)
     
     return {"message": "Product deleted successfully"}
 
 # Category endpoints
 @router.get("/categories/", response_model=List[CategoryResponse])
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all active categories."""
-    categories = db.query(Category).filter(Category.is_active == True).all()
-    return categories
+    cache_key = await category_list_key()
+    etag = catalog_etag(cache_key)
+    headers = cache_headers(etag, CATALOG_HTTP_MAX_AGE)
+    matched = is_not_modified(request, etag)
+    if matched is not None:
+        return not_modified_response(headers, matched)
+    
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached, headers=headers)
+    
+    categories = (await db.scalars(select(Category).where(Category.is_active == True))).all()
+    response = [
+        CategoryResponse.model_validate(category).model_dump(mode="json")
+        for category in categories
+    ]
+    await cache.set(cache_key, response, CATALOG_CACHE_TTL)
+    return ORJSONResponse(response, headers=headers)
 
 @router.post("/categories/", response_model=CategoryResponse)
 async def create_category(
     category: CategoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_admin_user)
 ):
     """Create a new category (admin only)."""
     db_category = Category(**category.dict())
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await categories_changed()
+    await db.refresh(db_category)
     return db_category
 
 # Review endpoints
-@router.get("/{product_id}/reviews", response_model=List[ReviewResponse])
-async def get_product_reviews(product_id: int, db: Session = Depends(get_db)):
-    """Get reviews for a product."""
-    reviews = db.query(Review).filter(Review.product_id == product_id).all()
-    return reviews
+@router.get("/{product_id}/reviews", response_model=PaginatedResponse[ReviewResponse])
+async def get_product_reviews(
+    product_id: int,
+    sort: str = Query("newest", pattern=r"^(newest|highest|lowest)$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of a product's reviews; its rating totals are on the product."""
+    key_columns, parsers, descending = REVIEW_SORTS[sort]
+    reviews, next_cursor = await fetch_page(
+        db,
+        select(Review).options(*REVIEW_RESPONSE).where(Review.product_id == product_id),
+        key_columns,
+        parsers,
+        cursor,
+        limit,
+        descending
+    )
+    return model_response(PaginatedResponse[ReviewResponse](
+        items=[ReviewResponse.model_validate(review) for review in reviews],
+        limit=limit,
+        next_cursor=next_cursor
+    ))
 
 @router.post("/{product_id}/reviews", response_model=ReviewResponse)
 async def create_review(
     product_id: int,
     review: ReviewCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Create a review for a product."""
     # Check if product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Check if user already reviewed this product
-    existing_review = db.query(Review).filter(
+    existing_review = await db.scalar(select(Review).where(
         and_(Review.user_id == current_user.id, Review.product_id == product_id)
-    ).first()
+    ))
     
     if existing_review:
         raise HTTPException(status_code=400, detail="You have already reviewed this product")
     
-    # Check if user has purchased this product (for verified purchase)
-    # This would require checking order history
-    is_verified = False  # Implement order verification logic
+    # Verified if the user has paid for this product (see purchases.py)
+    is_verified = await has_purchased(db, current_user.id, product_id)
+    if REVIEWS_REQUIRE_PURCHASE and not is_verified:
+        raise HTTPException(status_code=403, detail="Only customers who bought this product can review it")
     
     db_review = Review(
         user_id=current_user.id,
@@ -195,7 +373,47 @@ async def create_review(
     )
     
     db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
+    # Counted in the same transaction, so the totals never miss a review
+    await add_rating(db, product_id, review.rating)
+    await db.commit()
+    await product_stats_changed(product_id)
     
-    return db_review
+    return await db.scalar(
+        select(Review)
+        .options(*REVIEW_RESPONSE)
+        .where(Review.id == db_review.id)
+        .execution_options(populate_existing=True)
+    )
+
+@router.put("/{product_id}/reviews", response_model=ReviewResponse)
+async def update_review(
+    product_id: int,
+    review_update: ReviewUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Edit the current user's review of a product."""
+    # Locked, so concurrent edits move the product's totals from the right rating
+    db_review = await db.scalar(
+        select(Review)
+        .where(and_(Review.user_id == current_user.id, Review.product_id == product_id))
+        .with_for_update()
+    )
+    if not db_review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    
+    update_data = review_update.dict(exclude_unset=True)
+    if update_data.get("rating") is not None:
+        await change_rating(db, product_id, db_review.rating, update_data["rating"])
+        db_review.rating = update_data["rating"]
+    if "comment" in update_data:
+        db_review.comment = update_data["comment"]
+    await db.commit()
+    await product_stats_changed(product_id)
+    
+    return await db.scalar(
+        select(Review)
+        .options(*REVIEW_RESPONSE)
+        .where(Review.id == db_review.id)
+        .execution_options(populate_existing=True)
+    )
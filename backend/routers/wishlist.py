@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select, delete
+from typing import List
+from database import get_async_db, upsert
+from models import Product, User, WishlistItem
+from schemas import WishlistItemCreate, WishlistItemResponse, WishlistMembership
+from auth import get_current_active_user
+from loaders import WISHLIST_ITEM_RESPONSE
+
+router = APIRouter()
+
+# Most product ids one membership lookup accepts (a listing page is at most 100)
+WISHLIST_LOOKUP_MAX_IDS = 100
+
+@router.get("/", response_model=List[WishlistItemResponse])
+async def get_wishlist(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the current user's wishlist, most recently added first."""
+    items = (await db.scalars(
+        select(WishlistItem)
+        .options(*WISHLIST_ITEM_RESPONSE)
+        .where(WishlistItem.user_id == current_user.id)
+        .order_by(WishlistItem.id.desc())
+    )).all()
+    return items
+
+@router.get("/contains", response_model=WishlistMembership)
+async def get_wishlist_membership(
+    product_ids: List[int] = Query(...),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Which of ``product_ids`` are wishlisted, for a whole listing page at once."""
+    if len(product_ids) > WISHLIST_LOOKUP_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {WISHLIST_LOOKUP_MAX_IDS} product ids per lookup")
+    
+    # One probe of the (user_id, product_id) unique index per id
+    wishlisted = (await db.scalars(
+        select(WishlistItem.product_id)
+        .where(and_(WishlistItem.user_id == current_user.id, WishlistItem.product_id.in_(product_ids)))
+        .order_by(WishlistItem.product_id)
+    )).all()
+    return WishlistMembership(product_ids=wishlisted)
+
+@router.post("/", response_model=WishlistItemResponse)
+async def add_to_wishlist(
+    item: WishlistItemCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add a product to the wishlist; adding it again returns the existing item."""
+    product = await db.scalar(
+        select(Product.id).where(and_(Product.id == item.product_id, Product.is_active == True))
+    )
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    await db.execute(
+        upsert(db, WishlistItem)
+        .values(user_id=current_user.id, product_id=item.product_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+    )
+    await db.commit()
+    
+    return await db.scalar(
+        select(WishlistItem)
+        .options(*WISHLIST_ITEM_RESPONSE)
+        .where(and_(WishlistItem.user_id == current_user.id, WishlistItem.product_id == item.product_id))
+    )
+
+@router.delete("/{product_id}")
+async def remove_from_wishlist(
+    product_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Remove a product from the wishlist."""
+    result = await db.execute(
+        delete(WishlistItem).where(
+            and_(WishlistItem.user_id == current_user.id, WishlistItem.product_id == product_id)
+        )
+    )
+    await db.commit()
+    
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Product not in wishlist")
+    return {"message": "Item removed from wishlist"}
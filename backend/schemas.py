@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, Generic, Optional, List, TypeVar
 from datetime import datetime
 from models import UserRole, OrderStatus, PaymentStatus
 
@@ -34,6 +34,9 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
 
 # Category schemas
 class CategoryBase(BaseModel):
@@ -85,6 +88,9 @@ class ProductResponse(ProductBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     category: Optional[CategoryResponse] = None
+    reviews_count: int = 0
+    rating_average: float = 0
+    rating_histogram: Dict[int, int] = {}  # Stars -> number of reviews
     
     class Config:
         from_attributes = True
@@ -92,13 +98,17 @@ class ProductResponse(ProductBase):
 # Cart schemas
 class CartItemBase(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(..., ge=1)
 
 class CartItemCreate(CartItemBase):
     pass
 
 class CartItemUpdate(BaseModel):
-    quantity: int
+    quantity: int = Field(..., ge=1)
+
+class CartBatchUpdate(BaseModel):
+    items: List[CartItemCreate] = Field(..., min_length=1, max_length=100)
+    replace: bool = False  # Set quantities instead of adding to them
 
 class CartItemResponse(CartItemBase):
     id: int
@@ -109,6 +119,22 @@ class CartItemResponse(CartItemBase):
     class Config:
         from_attributes = True
 
+class CartSummaryLine(BaseModel):
+    item_id: int
+    product_id: int
+    name: str
+    price: float
+    quantity: int
+    line_total: float
+    available: int  # Stock this cart could still take, counting its own holds
+    in_stock: bool
+
+class CartSummary(BaseModel):
+    item_count: int
+    quantity_total: int
+    subtotal: float
+    lines: List[CartSummaryLine]
+
 # Order schemas
 class OrderItemBase(BaseModel):
     product_id: int
@@ -161,18 +187,30 @@ class WishlistItemResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class WishlistMembership(BaseModel):
+    product_ids: List[int]  # The requested products that are in the wishlist
+
 # Review schemas
 class ReviewBase(BaseModel):
-    rating: int
+    rating: int = Field(..., ge=1, le=5)
     comment: Optional[str] = None
 
 class ReviewCreate(ReviewBase):
     product_id: int
 
 class ReviewUpdate(BaseModel):
-    rating: Optional[int] = None
+    rating: Optional[int] = Field(None, ge=1, le=5)
     comment: Optional[str] = None
 
+class ReviewAuthor(BaseModel):
+    """The reviewer fields shown publicly next to a review."""
+    id: int
+    first_name: str
+    last_name: str
+    
+    class Config:
+        from_attributes = True
+
 class ReviewResponse(ReviewBase):
     id: int
     user_id: int
@@ -180,7 +218,7 @@ class ReviewResponse(ReviewBase):
     is_verified_purchase: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
-    user: UserResponse
+    user: ReviewAuthor
     
     class Config:
         from_attributes = True
@@ -194,9 +232,12 @@ class ProductSearch(BaseModel):
     page: int = 1
     limit: int = 20
 
-class PaginatedResponse(BaseModel):
-    items: List[dict]
-    total: int
-    page: int
+T = TypeVar("T")
+
+class PaginatedResponse(BaseModel, Generic[T]):
+    items: List[T]
+    total: Optional[int] = None
+    page: Optional[int] = None
     limit: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
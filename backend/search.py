@@ -0,0 +1,161 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import re
+
+from sqlalchemy import DDL, event, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import cache
+from catalog import PRODUCTS_VERSION_KEY
+from models import Product
+
+# On PostgreSQL products carry a trigger-maintained tsvector column (name
+# weighted above description) with a GIN index. Other databases (SQLite in local and test runs)
+# fall back to an in-memory inverted index, rebuilt lazily once the catalog's
+# products version moves on.
+SEARCH_CONFIG = "english"
+
+search_vector = literal_column("products.search_vector")
+
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL("ALTER TABLE products ADD COLUMN search_vector tsvector").execute_if(dialect="postgresql"),
+)
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$ BEGIN "
+        "NEW.search_vector := "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B'); "
+        "RETURN NEW; END $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "CREATE TRIGGER products_search_vector_update "
+        "BEFORE INSERT OR UPDATE OF name, description ON products "
+        "FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "CREATE INDEX ix_products_search_vector ON products USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql"),
+)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return re.findall(r"\w+", (text or "").lower())
+
+def to_prefix_tsquery(term: str) -> Optional[str]:
+    """Build a tsquery matching every token of ``term`` as a prefix."""
+    tokens = tokenize(term)
+    if not tokens:
+        return None
+    return " & ".join(f"{token}:*" for token in tokens)
+
+class InvertedIndex:
+    """In-memory inverted index over product names and descriptions."""
+    
+    NAME_WEIGHT = 2.0
+    DESCRIPTION_WEIGHT = 1.0
+    
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.vocabulary: List[str] = []
+    
+    def add(self, product_id: int, name: Optional[str], description: Optional[str]):
+        """Index a product's name and description."""
+        for weight, text in ((self.NAME_WEIGHT, name), (self.DESCRIPTION_WEIGHT, description)):
+            for token in tokenize(text):
+                scores = self.postings[token]
+                scores[product_id] = scores.get(product_id, 0.0) + weight
+    
+    def finalize(self):
+        """Sort the vocabulary so prefix lookups can bisect it."""
+        self.vocabulary = sorted(self.postings)
+    
+    def _prefix_scores(self, prefix: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            for product_id, score in self.postings[self.vocabulary[position]].items():
+                scores[product_id] = scores.get(product_id, 0.0) + score
+            position += 1
+        return scores
+    
+    def search(self, term: str) -> List[int]:
+        """Return product ids matching every token prefix, best match first."""
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        
+        totals: Optional[Dict[int, float]] = None
+        for token in tokens:
+            scores = self._prefix_scores(token)
+            if totals is None:
+                totals = scores
+            else:
+                matched: Set[int] = totals.keys() & scores.keys()
+                totals = {pid: totals[pid] + scores[pid] for pid in matched}
+            if not totals:
+                return []
+        
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked]
+
+class FallbackSearch:
+    """Lazily (re)built inverted index for databases without full-text search."""
+    
+    def __init__(self):
+        self.index: Optional[InvertedIndex] = None
+        self.version: Optional[Tuple[str, int]] = None
+    
+    async def get_index(self, db: AsyncSession) -> InvertedIndex:
+        # The version counter is shared between workers when the cache is,
+        # so an edit made through any worker retires every worker's index
+        version = (cache.counter_epoch, await cache.get_counter(PRODUCTS_VERSION_KEY))
+        if self.index is None or self.version != version:
+            index = InvertedIndex()
+            rows = await db.execute(
+                select(Product.id, Product.name, Product.description).where(Product.is_active == True)
+            )
+            for product_id, name, description in rows:
+                index.add(product_id, name, description)
+            index.finalize()
+            self.index, self.version = index, version
+        return self.index
+
+fallback_search = FallbackSearch()
+
+async def apply_search(db: AsyncSession, query, term: str, rank: bool = True):
+    """Restrict a product select to ``term`` matches, optionally ordered by relevance."""
+    if db.bind.dialect.name == "postgresql":
+        tsquery_text = to_prefix_tsquery(term)
+        if tsquery_text is None:
+            return query
+        tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+        query = query.where(search_vector.op("@@")(tsquery))
+        if rank:
+            query = query.order_by(func.ts_rank_cd(search_vector, tsquery).desc(), Product.id)
+        return query
+    
+    if not tokenize(term):
+        return query
+    index = await fallback_search.get_index(db)
+    # Every match goes to the database as one JSON array, so the other filters
+    # and the pagination apply to all of them; its positions are the ranking
+    matches = func.json_each(json.dumps(index.search(term))).table_valued("key", "value")
+    query = query.join(matches, matches.c.value == Product.id)
+    if rank:
+        query = query.order_by(matches.c.key, Product.id)
+    return query
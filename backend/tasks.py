@@ -0,0 +1,41 @@
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tasks: List[asyncio.Task] = []
+
+async def _run_periodically(name: str, job: Callable[[], Awaitable], interval: float, wakeup: Optional[asyncio.Event]):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background job {name} failed: {e}")
+        if wakeup is None:
+            await asyncio.sleep(interval)
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+
+def start_periodic(name: str, job: Callable[[], Awaitable], interval: float, wakeup: Optional[asyncio.Event] = None) -> asyncio.Task:
+    """Run ``job`` every ``interval`` seconds until stop_background_tasks().
+    
+    Setting ``wakeup`` runs the job again straight away instead of waiting
+    for the rest of the interval.
+    """
+    task = asyncio.create_task(_run_periodically(name, job, interval, wakeup), name=name)
+    _tasks.append(task)
+    return task
+
+async def stop_background_tasks():
+    """Cancel every task started with start_periodic and wait for them to exit."""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
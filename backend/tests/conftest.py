@@ -0,0 +1,76 @@
+"""Shared fixtures: a throwaway database and an app client.
+
+Tests run against a fresh SQLite file by default; set TEST_DATABASE_URL to
+run them against PostgreSQL instead (the stress tests are only meaningful
+there, since SQLite serializes writers).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+_test_dir = tempfile.mkdtemp(prefix="ecom-store-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_test_dir}/test.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["DB_SCHEMA_MODE"] = "create"
+os.environ["CACHE_URL"] = ""
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["PAYMENT_GATEWAY"] = "fake"
+os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_test"
+# Tests drive the webhook worker themselves (see also the client fixture)
+os.environ["WEBHOOK_WORKERS"] = "0"
+# No pooling on PostgreSQL: asyncpg connections cannot move between the event
+# loops that asyncio.run() and each TestClient create
+os.environ.setdefault("DB_PGBOUNCER", "true")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from cache import cache, create_cache
+from database import Base, SessionLocal, async_engine, engine
+
+async def _connect():
+    async with async_engine.connect():
+        pass
+
+@pytest.fixture
+def db():
+    """A sync session on an empty schema; the cache is emptied as well."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cache.__init__()
+    # The app's shutdown disposes the async pool; a new pool's first connect
+    # must not be contended, or concurrent connects on the next loop deadlock
+    asyncio.run(_connect())
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client(db):
+    import main
+    from tasks import stop_background_tasks
+    
+    with TestClient(main.app) as test_client:
+        # Tests run the background jobs themselves, when they need them
+        test_client.portal.call(stop_background_tasks)
+        yield test_client
+
+@pytest.fixture(params=["memory", "fakeredis://"])
+def cache_backend(request, db, monkeypatch):
+    """The app's cache, swapped for each backend in turn."""
+    if request.param == "memory":
+        yield cache
+        return
+    import main
+    
+    shared, backend = cache, create_cache(request.param)
+    asyncio.run(backend.client.flushall())
+    for module in list(sys.modules.values()):
+        if getattr(module, "cache", None) is shared:
+            monkeypatch.setattr(module, "cache", backend)
+    yield backend
@@ -0,0 +1,48 @@
+"""Helpers shared by the tests for creating rows and authenticating."""
+from auth import create_access_token, get_password_hash, token_claims
+from models import Category, Order, OrderItem, Product, User, UserRole
+
+def make_user(db, username: str, role: UserRole = UserRole.USER) -> User:
+    user = User(
+        email=f"{username}@example.com",
+        username=username,
+        hashed_password=get_password_hash("password"),
+        first_name=username.title(),
+        last_name="Test",
+        role=role
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+
+def make_products(db, count: int, stock_quantity: int = 10) -> list:
+    category = Category(name=f"Category {count}")
+    db.add(category)
+    products = [
+        Product(name=f"Product {i}", price=10 + i, stock_quantity=stock_quantity, category=category)
+        for i in range(count)
+    ]
+    db.add_all(products)
+    db.commit()
+    return products
+
+def make_order(db, user: User, products: list, quantity: int = 1) -> Order:
+    """A pending order for ``quantity`` of each of ``products``."""
+    order = Order(
+        user_id=user.id,
+        total_amount=sum(product.price * quantity for product in products),
+        stripe_payment_intent_id=f"pi_{user.id}_{len(user.orders)}",
+        shipping_address="1 Test Street",
+        billing_address="1 Test Street"
+    )
+    db.add(order)
+    db.flush()
+    db.add_all([
+        OrderItem(order_id=order.id, product_id=product.id, quantity=quantity, price=product.price)
+        for product in products
+    ])
+    db.commit()
+    return order
@@ -0,0 +1,61 @@
+import time
+
+from auth import get_password_hash
+from models import User, UserRole
+from support import auth_headers, make_user
+
+def _login(client, username: str, password: str):
+    return client.post("/api/auth/login", data={"username": username, "password": password})
+
+def _expire_principals_quickly(monkeypatch):
+    # Cache principals for a second so tests can outwait them
+    monkeypatch.setattr("auth.USER_CACHE_TTL", 1)
+
+def test_deactivated_user_is_rejected_at_once(client, db):
+    admin = auth_headers(make_user(db, "admin", role=UserRole.ADMIN))
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    assert client.get("/api/cart/", headers=headers).status_code == 200  # Principal now cached
+    
+    assert client.put(f"/api/admin/users/{user.id}/toggle-active", headers=admin).status_code == 200
+    response = client.get("/api/cart/", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["message"] == "Inactive user"
+
+def test_direct_changes_take_effect_within_the_ttl(client, db, monkeypatch):
+    _expire_principals_quickly(monkeypatch)
+    user = make_user(db, "shopper")
+    admin = make_user(db, "admin", role=UserRole.ADMIN)
+    headers, admin_headers = auth_headers(user), auth_headers(admin)
+    assert client.get("/api/cart/", headers=headers).status_code == 200
+    assert client.get("/api/admin/users", headers=admin_headers).status_code == 200
+    
+    # Changed behind the app's back: the cached principals hold until they expire
+    user.is_active = False
+    admin.role = UserRole.USER
+    db.commit()
+    time.sleep(1.1)
+    assert client.get("/api/cart/", headers=headers).status_code == 400
+    assert client.get("/api/admin/users", headers=admin_headers).status_code == 403
+
+def test_embedded_claims_hold_until_the_token_is_reissued(client, db, monkeypatch):
+    monkeypatch.setattr("auth.JWT_EMBED_CLAIMS", True)
+    admin = make_user(db, "admin", role=UserRole.ADMIN)
+    headers = auth_headers(admin)
+    
+    admin.role = UserRole.USER
+    db.commit()
+    assert client.get("/api/admin/users", headers=headers).status_code == 200
+    # The profile always comes from the database, and a new token carries the new role
+    assert client.get("/api/auth/me", headers=headers).json()["role"] == "user"
+    token = _login(client, "admin", "password").json()["access_token"]
+    assert client.get("/api/admin/users", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+def test_password_change_applies_to_the_next_login(client, db):
+    user = make_user(db, "shopper")
+    assert client.get("/api/cart/", headers=auth_headers(user)).status_code == 200
+    
+    db.get(User, user.id).hashed_password = get_password_hash("new password")
+    db.commit()
+    assert _login(client, "shopper", "password").status_code == 401
+    assert _login(client, "shopper", "new password").status_code == 200
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from catalog import PRODUCTS_VERSION_KEY, product_list_key, products_changed
+
+def test_values_round_trip_and_delete(cache_backend):
+    async def run():
+        await cache_backend.set("key", {"items": [1, 2], "total": 2})
+        stored = await cache_backend.get("key")
+        await cache_backend.delete("key", "missing")
+        return stored, await cache_backend.get("key")
+    
+    assert asyncio.run(run()) == ({"items": [1, 2], "total": 2}, None)
+    assert cache_backend.info()["hits"] == 1
+
+def test_counters_increment_from_zero(cache_backend):
+    async def run():
+        before = await cache_backend.get_counter("counter")
+        counts = [await cache_backend.incr("counter") for _ in range(3)]
+        return before, counts, await cache_backend.get_counter("counter")
+    
+    assert asyncio.run(run()) == (0, [1, 2, 3], 3)
+
+def test_entries_expire_after_their_ttl(cache_backend):
+    asyncio.run(cache_backend.set("short", "value", 1))
+    asyncio.run(cache_backend.set("long", "value", 60))
+    time.sleep(1.1)
+    assert asyncio.run(cache_backend.get("short")) is None
+    assert asyncio.run(cache_backend.get("long")) == "value"
+
+def test_products_version_retires_listing_keys(cache_backend):
+    async def run():
+        params = {"search": "bag", "page": 1}
+        before = await product_list_key(params)
+        await cache_backend.set(before, {"items": []})
+        await products_changed()
+        return before, await product_list_key(params)
+    
+    before, after = asyncio.run(run())
+    assert before != after
+    assert asyncio.run(cache_backend.get_counter(PRODUCTS_VERSION_KEY)) == 1
+    assert asyncio.run(cache_backend.get(after)) is None
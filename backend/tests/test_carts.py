@@ -0,0 +1,113 @@
+import asyncio
+
+from sqlalchemy import func
+
+from carts import cart_changed
+from models import CartItem, StockReservation
+from support import auth_headers, make_products, make_user
+
+def _batch(client, headers, items, replace: bool = False):
+    return client.post("/api/cart/batch", headers=headers, json={
+        "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items],
+        "replace": replace,
+    })
+
+def _cart(db, user_id: int) -> dict:
+    db.expire_all()
+    return dict(db.query(CartItem.product_id, CartItem.quantity).filter(CartItem.user_id == user_id).all())
+
+def _held(db, user_id: int) -> dict:
+    return dict(
+        db.query(StockReservation.product_id, func.sum(StockReservation.quantity))
+        .filter(StockReservation.user_id == user_id)
+        .group_by(StockReservation.product_id)
+        .all()
+    )
+
+def test_batch_adds_to_lines_and_replace_sets_them(client, db):
+    first, second = make_products(db, 2)
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    
+    assert _batch(client, headers, [(first.id, 2)]).status_code == 200
+    assert _batch(client, headers, [(first.id, 3), (second.id, 1)]).status_code == 200
+    assert _cart(db, user.id) == {first.id: 5, second.id: 1}
+    
+    response = _batch(client, headers, [(first.id, 1), (second.id, 4)], replace=True)
+    assert response.status_code == 200
+    assert {item["product_id"]: item["quantity"] for item in response.json()} == {first.id: 1, second.id: 4}
+    assert _cart(db, user.id) == _held(db, user.id) == {first.id: 1, second.id: 4}
+
+def test_duplicate_products_in_a_batch(client, db):
+    product = make_products(db, 1)[0]
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    
+    assert _batch(client, headers, [(product.id, 2), (product.id, 3)]).status_code == 200
+    assert _cart(db, user.id) == {product.id: 5}
+    # With replace the last quantity given wins
+    assert _batch(client, headers, [(product.id, 2), (product.id, 3)], replace=True).status_code == 200
+    assert _cart(db, user.id) == _held(db, user.id) == {product.id: 3}
+
+def test_inactive_or_missing_products_write_nothing(client, db):
+    active, inactive = make_products(db, 2)
+    inactive.is_active = False
+    db.commit()
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    
+    for items in ([(active.id, 1), (inactive.id, 1)], [(active.id, 1), (inactive.id + 100, 1)]):
+        response = _batch(client, headers, items)
+        assert response.status_code == 404
+        assert response.json()["message"] == "Product not found"
+    assert _cart(db, user.id) == _held(db, user.id) == {}
+
+def test_short_stock_rolls_the_whole_batch_back(client, db):
+    plenty, scarce = make_products(db, 2, stock_quantity=3)
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    assert _batch(client, headers, [(plenty.id, 1)]).status_code == 200
+    
+    response = _batch(client, headers, [(plenty.id, 1), (scarce.id, 4)])
+    assert response.status_code == 400
+    assert "Available: 3, Requested: 4" in response.json()["message"]
+    assert _cart(db, user.id) == _held(db, user.id) == {plenty.id: 1}
+
+def test_summary_totals_and_availability(client, db):
+    first, second = make_products(db, 2, stock_quantity=10)
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    assert client.get("/api/cart/summary", headers=headers).json() == {
+        "item_count": 0, "quantity_total": 0, "subtotal": 0.0, "lines": []
+    }
+    
+    _batch(client, headers, [(first.id, 2), (second.id, 3)])
+    _batch(client, auth_headers(make_user(db, "rival")), [(second.id, 4)])
+    summary = client.get("/api/cart/summary", headers=headers).json()
+    assert (summary["item_count"], summary["quantity_total"], summary["subtotal"]) == (2, 5, 2 * 10 + 3 * 11)
+    # A cart's own holds count as available to it; a rival's do not
+    assert [
+        (line["product_id"], line["line_total"], line["available"], line["in_stock"]) for line in summary["lines"]
+    ] == [(first.id, 20, 10, True), (second.id, 33, 6, True)]
+
+def test_cart_changed_refreshes_the_cached_summary(client, db):
+    product = make_products(db, 1)[0]
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    _batch(client, headers, [(product.id, 2)])
+    assert client.get("/api/cart/summary", headers=headers).json()["quantity_total"] == 2
+    
+    # Written behind the cart's back, so the cached summary stands
+    db.query(CartItem).filter(CartItem.user_id == user.id).update({"quantity": 7})
+    db.commit()
+    assert client.get("/api/cart/summary", headers=headers).json()["quantity_total"] == 2
+    asyncio.run(cart_changed(user.id))
+    summary = client.get("/api/cart/summary", headers=headers).json()
+    assert summary["quantity_total"] == 7
+    assert summary["lines"][0]["in_stock"]
+    
+    # Cart endpoints invalidate it themselves
+    _batch(client, headers, [(product.id, 1)], replace=True)
+    assert client.get("/api/cart/summary", headers=headers).json()["quantity_total"] == 1
+    client.delete("/api/cart/", headers=headers)
+    assert client.get("/api/cart/summary", headers=headers).json()["item_count"] == 0
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import timedelta
+
+from catalog import product_key
+from search import fallback_search
+from support import auth_headers, make_products, make_user
+
+def _evict(cache, product_id: int):
+    async def evict():
+        await cache.delete(await product_key(product_id))
+    
+    asyncio.run(evict())
+
+def test_listing_revalidates_with_the_compressed_validator(client, db, cache_backend):
+    make_products(db, 30)
+    gzipped = client.get("/api/products/", params={"limit": 30}, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    etag = gzipped.headers["etag"]
+    assert etag.endswith('-gzip"')
+    
+    revalidated = client.get(
+        "/api/products/", params={"limit": 30}, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.headers["vary"] == "Accept-Encoding"
+    assert revalidated.headers["cache-control"] == gzipped.headers["cache-control"]
+
+def test_product_revalidates_before_it_is_cached(client, db, cache_backend):
+    product = make_products(db, 1)[0]
+    first = client.get(f"/api/products/{product.id}", headers={"Accept-Encoding": "identity"})
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    
+    _evict(cache_backend, product.id)
+    revalidated = client.get(f"/api/products/{product.id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert cache_backend.info()["sets"] == 1  # Answered without serializing the product again
+    
+    assert client.get(f"/api/products/{product.id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(f"/api/products/{product.id}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_product_change_invalidates_its_etag(client, db, cache_backend):
+    product = make_products(db, 1)[0]
+    etag = client.get(f"/api/products/{product.id}").headers["etag"]
+    
+    product.price = 99
+    product.updated_at = product.created_at + timedelta(seconds=1)
+    db.commit()
+    _evict(cache_backend, product.id)
+    changed = client.get(f"/api/products/{product.id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_checkout_keeps_listings_and_refreshes_the_products_bought(client, db, cache_backend, monkeypatch):
+    # One listing window for the whole test
+    monkeypatch.setattr("catalog.CATALOG_LISTING_TTL", 10 ** 9)
+    products = make_products(db, 3, stock_quantity=10)
+    headers = auth_headers(make_user(db, "buyer"))
+    listing = client.get("/api/products/", params={"search": "product"})
+    etag = listing.headers["etag"]
+    index = fallback_search.index
+    assert index is not None
+    assert client.get(f"/api/products/{products[0].id}").json()["stock_quantity"] == 10
+    
+    client.post("/api/cart/add", headers=headers, json={"product_id": products[0].id, "quantity": 2})
+    order = client.post(
+        "/api/orders/", headers=headers, json={"shipping_address": "s", "billing_address": "b", "order_items": []}
+    )
+    assert order.status_code == 200
+    
+    revalidated = client.get("/api/products/", params={"search": "product"}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert fallback_search.index is index
+    assert client.get(f"/api/products/{products[0].id}").json()["stock_quantity"] == 8
@@ -0,0 +1,24 @@
+import asyncio
+
+from guest_cart import load_lines, save_lines
+from support import make_products
+
+def test_guest_cart_adds_up_quantities(client, db):
+    product = make_products(db, 1)[0]
+    
+    for _ in range(2):
+        response = client.post("/api/cart/add", json={"product_id": product.id, "quantity": 2})
+        assert response.status_code == 200, response.text
+    
+    items = client.get("/api/cart/").json()
+    assert [(item["product_id"], item["quantity"]) for item in items] == [(product.id, 4)]
+    assert items[0]["product"]["name"] == product.name
+
+def test_loaded_lines_do_not_alias_the_cache(db):
+    async def edit_without_saving():
+        await save_lines("cart", {1: {"quantity": 1, "created_at": "2024-01-01T00:00:00+00:00"}})
+        lines = await load_lines("cart")
+        lines[1].update(quantity=5)
+        return await load_lines("cart")
+    
+    assert asyncio.run(edit_without_saving())[1]["quantity"] == 1
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine
+
+from index_advisor import _scanned_tables, assert_no_sequential_scans
+from migrate import upgrade_schema
+
+def test_only_bare_scans_count_as_sequential():
+    plan = [
+        "SCAN products",
+        "SCAN TABLE orders",
+        "SCAN cart_items USING INDEX uq_cart_items_user_product",
+        "SCAN reviews USING COVERING INDEX ix_reviews_product_id_user_id",
+        "SEARCH users USING INDEX ix_users_username (username=?)",
+    ]
+    assert _scanned_tables(plan, "sqlite") == ["products", "orders"]
+    assert _scanned_tables(["Seq Scan on orders  (cost=0.00..1.01 rows=1 width=4)"], "postgresql") == ["orders"]
+
+def test_hot_queries_use_indexes_on_the_migrated_schema(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path}/migrated.db")
+    try:
+        upgrade_schema(bind)
+        assert_no_sequential_scans(bind)
+    finally:
+        bind.dispose()
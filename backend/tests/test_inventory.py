@@ -0,0 +1,130 @@
+import asyncio
+from sqlalchemy import event, func
+
+from support import auth_headers, make_products, make_user
+from database import AsyncSessionLocal, async_engine
+from inventory import hold_stock, sell_stock
+from models import Product, StockReservation
+
+STOCK = 10
+BUYERS = 40
+
+async def _checkout(user_id: int, product_id: int, quantity: int) -> int:
+    """One buyer's checkout; returns the quantity sold (0 if refused)."""
+    async with AsyncSessionLocal() as db:
+        if not await sell_stock(db, user_id, {product_id: quantity}):
+            await db.rollback()
+            return 0
+        await db.commit()
+        return quantity
+
+def _stock(db, product_id: int):
+    """The product's stock and the quantity held on it."""
+    db.expire_all()
+    held = db.query(func.coalesce(func.sum(StockReservation.quantity), 0)).filter(
+        StockReservation.product_id == product_id
+    ).scalar()
+    return db.get(Product, product_id).stock_quantity, held
+
+def test_concurrent_checkouts_never_oversell(db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    users = [make_user(db, f"buyer{i}").id for i in range(BUYERS)]
+    
+    async def stampede():
+        return await asyncio.gather(*[
+            _checkout(user_id, product.id, 1 + i % 3) for i, user_id in enumerate(users)
+        ])
+    
+    sold = asyncio.run(stampede())
+    stock, reserved = _stock(db, product.id)
+    assert sum(sold) <= STOCK
+    assert stock == STOCK - sum(sold) >= 0
+    assert reserved == 0
+
+def test_concurrent_holds_then_checkouts_never_oversell(db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    users = [make_user(db, f"buyer{i}").id for i in range(BUYERS)]
+    
+    async def hold(user_id: int) -> bool:
+        async with AsyncSessionLocal() as session:
+            try:
+                await hold_stock(session, user_id, {product.id: 1})
+            except Exception:
+                await session.rollback()
+                return False
+            await session.commit()
+            return True
+    
+    async def stampede():
+        held = await asyncio.gather(*[hold(user_id) for user_id in users])
+        sold = await asyncio.gather(*[_checkout(user_id, product.id, 1) for user_id in users])
+        return held, sold
+    
+    # Racing holds may add up past the stock; checkout must not
+    held, sold = asyncio.run(stampede())
+    stock, _ = _stock(db, product.id)
+    assert sum(sold) <= STOCK
+    assert stock == STOCK - sum(sold) >= 0
+
+def test_checkout_cannot_oversell_past_its_checks(db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    user = make_user(db, "buyer")
+    
+    assert asyncio.run(_checkout(user.id, product.id, STOCK + 5)) == 0
+    assert asyncio.run(_checkout(user.id, product.id, 0)) == 0
+    assert asyncio.run(_checkout(user.id, product.id, -1)) == 0
+    assert _stock(db, product.id)[0] == STOCK
+
+def test_negative_cart_quantity_is_rejected(client, db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    headers = auth_headers(make_user(db, "buyer"))
+    item = client.post("/api/cart/add", headers=headers, json={"product_id": product.id, "quantity": 2}).json()
+    
+    response = client.put(f"/api/cart/{item['id']}", headers=headers, json={"quantity": -100})
+    assert response.status_code == 422
+    assert _stock(db, product.id) == (STOCK, 2)
+
+def test_holds_never_write_the_product_row(db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    users = [make_user(db, f"buyer{i}").id for i in range(3)]
+    updated_at = product.updated_at
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    async def shop():
+        for user_id, quantity in zip(users, (3, 4, 2)):
+            async with AsyncSessionLocal() as session:
+                await hold_stock(session, user_id, {product.id: quantity})
+                await session.commit()
+        async with AsyncSessionLocal() as session:
+            await hold_stock(session, users[0], {product.id: 1})
+            await session.commit()
+    
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        asyncio.run(shop())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE PRODUCTS")]
+    assert _stock(db, product.id) == (STOCK, 7)
+    db.expire_all()
+    assert db.get(Product, product.id).updated_at == updated_at
+
+def test_holds_of_others_limit_what_can_be_held(client, db):
+    product = make_products(db, 1, stock_quantity=STOCK)[0]
+    first, second = (auth_headers(make_user(db, name)) for name in ("first", "second"))
+    
+    assert client.post("/api/cart/add", headers=first, json={"product_id": product.id, "quantity": 7}).status_code == 200
+    response = client.post("/api/cart/add", headers=second, json={"product_id": product.id, "quantity": 4})
+    assert response.status_code == 400
+    assert "Available: 3" in response.json()["message"]
+    assert client.post("/api/cart/add", headers=second, json={"product_id": product.id, "quantity": 3}).status_code == 200
+    
+    # The first shopper can still shrink and regrow within their own hold
+    item_id = client.get("/api/cart/", headers=first).json()[0]["id"]
+    assert client.put(f"/api/cart/{item_id}", headers=first, json={"quantity": 2}).status_code == 200
+    assert client.put(f"/api/cart/{item_id}", headers=first, json={"quantity": 7}).status_code == 200
+    assert _stock(db, product.id) == (STOCK, 10)
@@ -0,0 +1,22 @@
+import pytest
+
+from support import make_products
+
+PRODUCTS = 25
+
+def _follow(client, **params):
+    ids, cursor = [], None
+    for _ in range(PRODUCTS):
+        page = client.get("/api/products/", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+    pytest.fail("next_cursor never ran out")
+
+@pytest.mark.parametrize("sort", ["id", "-id", "price", "-price", "name", "created_at", "-created_at"])
+def test_cursor_pages_cover_every_product_once(client, db, sort):
+    make_products(db, PRODUCTS)
+    ids = _follow(client, sort=sort, limit=4)
+    assert len(ids) == PRODUCTS
+    assert len(set(ids)) == PRODUCTS
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from auth import PasswordHasher, password_hasher
+from models import User
+from support import make_user
+
+def _login(client, username: str = "shopper"):
+    return client.post("/api/auth/login", data={"username": username, "password": "password"})
+
+def test_saturated_pool_rejects_the_overflow():
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    release = threading.Event()
+    
+    async def burst():
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        return await asyncio.gather(*[hasher.run(release.wait, 5) for _ in range(3)], return_exceptions=True)
+    
+    try:
+        first, second, third = asyncio.run(burst())
+    finally:
+        hasher.shutdown()
+    assert first is True and second is True
+    assert isinstance(third, HTTPException) and third.status_code == 429
+
+def test_login_answers_429_while_the_pool_is_saturated(client, db, monkeypatch):
+    make_user(db, "shopper")
+    monkeypatch.setattr(password_hasher, "pending", password_hasher.max_pending)
+    
+    response = _login(client)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+def test_login_upgrades_a_hash_made_at_a_lower_cost(client, db, monkeypatch):
+    user = make_user(db, "shopper")
+    assert user.hashed_password.startswith("$2b$04$")
+    monkeypatch.setattr("auth.pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5))
+    
+    assert _login(client).status_code == 200
+    db.expire_all()
+    upgraded = db.get(User, user.id).hashed_password
+    assert upgraded.startswith("$2b$05$")
+    
+    assert _login(client).status_code == 200
+    db.expire_all()
+    assert db.get(User, user.id).hashed_password == upgraded
@@ -0,0 +1,69 @@
+from urllib.parse import parse_qs
+
+import httpx
+
+from models import Order
+from payments import FakeGateway, StripeGateway
+from support import make_order, make_products, make_user
+
+class FakeStripe:
+    """Answers /v1/payment_intents the way Stripe does, idempotency keys included."""
+    
+    def __init__(self):
+        self.requests = []
+        self.intents = {}
+    
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        key = request.headers["Idempotency-Key"]
+        if key not in self.intents:
+            number = len(self.intents) + 1
+            self.intents[key] = {"id": f"pi_{number}", "client_secret": f"pi_{number}_secret"}
+        return httpx.Response(200, json=self.intents[key])
+
+def _stripe_gateway(handler) -> StripeGateway:
+    """A StripeGateway whose requests go to ``handler`` instead of the network."""
+    return StripeGateway(api_key="sk_test", base_url="https://api.stripe.test", transport=httpx.MockTransport(handler))
+
+def _pay(client, order: Order):
+    return client.post("/api/webhooks/stripe/create-payment-intent", params={"order_id": order.id})
+
+def test_checkout_goes_through_the_gateway_once_per_order(client, db, monkeypatch):
+    stripe = FakeStripe()
+    monkeypatch.setattr("routers.webhooks.payment_gateway", _stripe_gateway(stripe.handle))
+    product = make_products(db, 1)[0]
+    order = make_order(db, make_user(db, "buyer"), [product], 2)
+    
+    first, retried = _pay(client, order), _pay(client, order)
+    assert first.status_code == retried.status_code == 200
+    assert first.json() == retried.json() == {"client_secret": "pi_1_secret", "payment_intent_id": "pi_1"}
+    assert len(stripe.intents) == 1
+    
+    request = stripe.requests[0]
+    assert request.url.path == "/v1/payment_intents"
+    assert request.headers["Idempotency-Key"] == f"order-{order.id}-payment-intent"
+    form = parse_qs(request.content.decode())
+    assert form["amount"] == [str(round(order.total_amount * 100))]
+    assert form["metadata[order_id]"] == [str(order.id)]
+    db.expire_all()
+    assert db.get(Order, order.id).stripe_payment_intent_id == "pi_1"
+
+def test_retried_checkout_reuses_the_fake_intent(client, db, monkeypatch):
+    gateway = FakeGateway()
+    monkeypatch.setattr("routers.webhooks.payment_gateway", gateway)
+    product = make_products(db, 1)[0]
+    order = make_order(db, make_user(db, "buyer"), [product])
+    
+    assert _pay(client, order).json() == _pay(client, order).json()
+    assert list(gateway.intents) == [order.id]
+
+def test_declined_intent_is_a_payment_error(client, db, monkeypatch):
+    def decline(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(402, json={"error": {"message": "Your card was declined."}})
+    
+    monkeypatch.setattr("routers.webhooks.payment_gateway", _stripe_gateway(decline))
+    order = make_order(db, make_user(db, "buyer"), make_products(db, 1))
+    
+    response = _pay(client, order)
+    assert response.status_code == 400
+    assert response.json()["message"] == "Payment error: Your card was declined."
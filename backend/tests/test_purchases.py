@@ -0,0 +1,42 @@
+import asyncio
+
+from database import AsyncSessionLocal
+from support import auth_headers, make_order, make_products, make_user
+from webhook_worker import handle_payment_success
+
+def _pay(order):
+    async def pay():
+        async with AsyncSessionLocal() as session:
+            await handle_payment_success(session, {"id": order.stripe_payment_intent_id})
+            await session.commit()
+    
+    asyncio.run(pay())
+
+def _review(client, headers, product_id: int):
+    return client.post(
+        f"/api/products/{product_id}/reviews", headers=headers, json={"product_id": product_id, "rating": 4}
+    )
+
+def test_only_paid_orders_verify_a_review(client, db):
+    bought, unpaid, never = make_products(db, 3)
+    user = make_user(db, "buyer")
+    headers = auth_headers(user)
+    _pay(make_order(db, user, [bought]))
+    make_order(db, user, [unpaid])
+    
+    assert _review(client, headers, bought.id).json()["is_verified_purchase"] is True
+    assert _review(client, headers, unpaid.id).json()["is_verified_purchase"] is False
+    assert _review(client, headers, never.id).json()["is_verified_purchase"] is False
+
+def test_review_without_a_purchase_is_rejected_when_required(client, db, monkeypatch):
+    monkeypatch.setattr("routers.products.REVIEWS_REQUIRE_PURCHASE", True)
+    bought, other = make_products(db, 2)
+    user = make_user(db, "buyer")
+    headers = auth_headers(user)
+    _pay(make_order(db, user, [bought]))
+    
+    response = _review(client, headers, other.id)
+    assert response.status_code == 403
+    assert response.json()["message"] == "Only customers who bought this product can review it"
+    assert client.get(f"/api/products/{other.id}").json()["reviews_count"] == 0
+    assert _review(client, headers, bought.id).status_code == 200
@@ -0,0 +1,37 @@
+"""Endpoints whose query count must not grow with the number of rows returned."""
+from models import CartItem
+from querycount import assert_constant_query_count, count_queries
+from support import auth_headers, make_order, make_products, make_user
+
+SIZES = (1, 8)
+
+def _count(client, path: str, **kwargs) -> int:
+    with count_queries() as counter:
+        response = client.get(path, **kwargs)
+    assert response.status_code == 200, response.text
+    return counter.count
+
+def test_orders_list(client, db):
+    products = make_products(db, 3)
+    counts = {}
+    for size in SIZES:
+        user = make_user(db, f"buyer{size}")
+        for _ in range(size):
+            make_order(db, user, products)
+        counts[size] = _count(client, "/api/orders/", headers=auth_headers(user))
+    assert_constant_query_count(counts)
+
+def test_cart(client, db):
+    products = make_products(db, max(SIZES))
+    counts = {}
+    for size in SIZES:
+        user = make_user(db, f"shopper{size}")
+        db.add_all([CartItem(user_id=user.id, product_id=product.id, quantity=1) for product in products[:size]])
+        db.commit()
+        counts[size] = _count(client, "/api/cart/", headers=auth_headers(user))
+    assert_constant_query_count(counts)
+
+def test_product_list(client, db):
+    make_products(db, max(SIZES))
+    counts = {size: _count(client, "/api/products/", params={"limit": size}) for size in SIZES}
+    assert_constant_query_count(counts)
@@ -0,0 +1,54 @@
+import asyncio
+
+from database import AsyncSessionLocal
+from models import Product
+from ratings import reconcile_ratings
+from support import auth_headers, make_products, make_user
+
+def _review(client, headers, product_id: int, rating: int):
+    return client.post(
+        f"/api/products/{product_id}/reviews", headers=headers,
+        json={"product_id": product_id, "rating": rating, "comment": "Fine"}
+    )
+
+def _ratings(client, product_id: int):
+    product = client.get(f"/api/products/{product_id}").json()
+    return product["reviews_count"], product["rating_average"], product["rating_histogram"]
+
+def _reconciled(db, product_id: int):
+    async def reconcile():
+        async with AsyncSessionLocal() as session:
+            await reconcile_ratings(session, [product_id])
+    
+    asyncio.run(reconcile())
+    db.expire_all()
+    product = db.get(Product, product_id)
+    return product.reviews_count, product.rating_sum, product.rating_average
+
+def test_rating_average_after_add_and_update(client, db):
+    product = make_products(db, 1)[0]
+    first, second = (auth_headers(make_user(db, name)) for name in ("first", "second"))
+    assert _ratings(client, product.id)[:2] == (0, 0)
+    
+    assert _review(client, first, product.id, 5).status_code == 200
+    assert _ratings(client, product.id)[:2] == (1, 5)
+    assert _review(client, second, product.id, 2).status_code == 200
+    count, average, histogram = _ratings(client, product.id)
+    assert (count, average) == (2, 3.5)
+    assert (histogram["5"], histogram["2"]) == (1, 1)
+    assert _review(client, second, product.id, 4).status_code == 400
+    
+    response = client.put(f"/api/products/{product.id}/reviews", headers=second, json={"rating": 4})
+    assert response.status_code == 200
+    assert (response.json()["rating"], response.json()["comment"]) == (4, "Fine")
+    count, average, histogram = _ratings(client, product.id)
+    assert (count, average) == (2, 4.5)
+    assert (histogram["5"], histogram["4"], histogram["2"]) == (1, 1, 0)
+    # The running totals agree with a recount from the reviews
+    assert _reconciled(db, product.id) == (2, 9, 4.5)
+
+def test_only_an_existing_review_can_be_edited(client, db):
+    product = make_products(db, 1)[0]
+    headers = auth_headers(make_user(db, "shopper"))
+    response = client.put(f"/api/products/{product.id}/reviews", headers=headers, json={"rating": 3})
+    assert response.status_code == 404
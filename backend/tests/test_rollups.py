@@ -0,0 +1,74 @@
+import asyncio
+
+from database import AsyncSessionLocal
+from models import DailySalesRollup, Order, ProductSalesRollup, UserRole
+from rollups import reconcile_recent_rollups, record_order_created
+from support import auth_headers, make_order, make_products, make_user
+from webhook_worker import handle_payment_failure, handle_payment_success
+
+def _totals(db):
+    db.expire_all()
+    daily = db.query(DailySalesRollup).all()
+    products = db.query(ProductSalesRollup).all()
+    return (
+        sum(row.orders_count for row in daily),
+        sum(row.completed_orders for row in daily),
+        round(sum(row.revenue for row in daily), 2),
+        sum(row.units_sold for row in products),
+    )
+
+async def _apply(handler, order: Order):
+    async with AsyncSessionLocal() as session:
+        await handler(session, {"id": order.stripe_payment_intent_id})
+        await session.commit()
+
+async def _record_created(order: Order):
+    async with AsyncSessionLocal() as session:
+        await record_order_created(session, order.id)
+        await session.commit()
+
+def test_concurrent_reconciles_agree_with_the_orders(db):
+    user = make_user(db, "buyer")
+    product = make_products(db, 1)[0]
+    paid = make_order(db, user, [product], 2)
+    make_order(db, user, [product], 1)
+    asyncio.run(_apply(handle_payment_success, paid))
+    
+    async def reconcile_everywhere():
+        await asyncio.gather(*[reconcile_recent_rollups() for _ in range(4)])
+    
+    asyncio.run(reconcile_everywhere())
+    assert _totals(db) == (2, 1, product.price * 2, 2)
+    asyncio.run(reconcile_everywhere())
+    assert _totals(db) == (2, 1, product.price * 2, 2)
+
+def test_failed_payment_after_success_is_taken_out(db):
+    user = make_user(db, "buyer")
+    product = make_products(db, 1)[0]
+    order = make_order(db, user, [product], 3)
+    asyncio.run(_record_created(order))
+    asyncio.run(_apply(handle_payment_success, order))
+    assert _totals(db) == (1, 1, product.price * 3, 3)
+    
+    asyncio.run(_apply(handle_payment_failure, order))
+    assert _totals(db) == (1, 0, 0, 0)
+    asyncio.run(_apply(handle_payment_failure, order))
+    assert _totals(db) == (1, 0, 0, 0)
+
+def test_payment_status_edits_move_the_rollups(client, db):
+    user = make_user(db, "buyer")
+    admin = auth_headers(make_user(db, "admin", role=UserRole.ADMIN))
+    product = make_products(db, 1)[0]
+    order = make_order(db, user, [product], 2)
+    asyncio.run(_record_created(order))
+    
+    def set_payment(headers, payment_status):
+        return client.put(f"/api/orders/{order.id}", headers=headers, json={"payment_status": payment_status})
+    
+    assert set_payment(auth_headers(user), "completed").status_code == 403
+    assert set_payment(admin, "completed").status_code == 200
+    assert _totals(db) == (1, 1, product.price * 2, 2)
+    assert set_payment(admin, "completed").status_code == 200
+    assert _totals(db) == (1, 1, product.price * 2, 2)
+    assert set_payment(admin, "refunded").status_code == 200
+    assert _totals(db) == (1, 0, 0, 0)
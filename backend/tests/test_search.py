@@ -0,0 +1,58 @@
+import asyncio
+
+from cache import cache
+from catalog import PRODUCTS_VERSION_KEY
+from models import Category, Product
+from support import make_products
+
+def _add(db, category: Category, name: str, description: str = None) -> Product:
+    product = Product(name=name, description=description, price=10, stock_quantity=1, category=category)
+    db.add(product)
+    db.commit()
+    return product
+
+def _search(client, term: str, **params):
+    response = client.get("/api/products/", params={"search": term, **params})
+    assert response.status_code == 200
+    return response.json()
+
+def _names(page) -> list:
+    return [item["name"] for item in page["items"]]
+
+def test_tokens_match_as_prefixes_and_all_must_match(client, db):
+    category = Category(name="Bags")
+    _add(db, category, "Leather backpack")
+    _add(db, category, "Leather wallet")
+    _add(db, category, "Canvas backpack")
+    
+    assert sorted(_names(_search(client, "leath"))) == ["Leather backpack", "Leather wallet"]
+    assert _names(_search(client, "LEA back")) == ["Leather backpack"]
+    assert _search(client, "leather tote")["total"] == 0
+
+def test_name_matches_rank_above_description_matches(client, db):
+    category = Category(name="Bags")
+    _add(db, category, "Weekender", "A roomy leather bag")
+    _add(db, category, "Leather tote", "Carries a laptop")
+    _add(db, category, "Leather leather strap", "Leather all the way")
+    
+    assert _names(_search(client, "leather")) == ["Leather leather strap", "Leather tote", "Weekender"]
+
+def test_filters_apply_to_every_match_of_a_broad_term(client, db):
+    make_products(db, 1200)
+    wanted = make_products(db, 5)
+    
+    page = _search(client, "product", category_id=wanted[0].category_id, limit=2)
+    assert page["total"] == 5
+    assert _names(page) == ["Product 0", "Product 1"]
+    assert _search(client, "product", limit=1)["total"] == 1205
+
+def test_index_follows_the_shared_products_version(client, db):
+    category = Category(name="Bags")
+    _add(db, category, "Leather backpack")
+    assert _search(client, "duffel")["total"] == 0
+    
+    # Added behind this worker's back, as another worker would
+    _add(db, category, "Duffel bag")
+    assert _search(client, "duff")["total"] == 0
+    asyncio.run(cache.incr(PRODUCTS_VERSION_KEY))
+    assert _names(_search(client, "duffel")) == ["Duffel bag"]
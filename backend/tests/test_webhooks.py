@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import webhook_worker
+from database import AsyncSessionLocal
+from models import Order, WebhookEvent, WebhookEventStatus
+from support import make_order, make_products, make_user
+from webhook_worker import claim_event, process_due_events, process_event, replay_events, retry_delay
+
+SECRET = "whsec_test"
+
+def _signed(event_id: str, event_type: str, payment_intent_id: str):
+    """A Stripe event body and headers signed the way Stripe signs them."""
+    payload = json.dumps({
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "data": {"object": {"id": payment_intent_id, "object": "payment_intent"}},
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"stripe-signature": f"t={timestamp},v1={signature}", "content-type": "application/json"}
+
+def _deliver(client, event_id: str, event_type: str, payment_intent_id: str):
+    payload, headers = _signed(event_id, event_type, payment_intent_id)
+    return client.post("/api/webhooks/stripe", content=payload, headers=headers)
+
+def _event(db, event_id: str) -> WebhookEvent:
+    db.expire_all()
+    return db.query(WebhookEvent).filter(WebhookEvent.stripe_event_id == event_id).one()
+
+def _make_due(db, event_id: str):
+    """Move an event's next attempt (a retry or a lease) into the past."""
+    event = _event(db, event_id)
+    event.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+
+async def _claim():
+    async with AsyncSessionLocal() as session:
+        return await claim_event(session)
+
+async def _process_one():
+    async with AsyncSessionLocal() as session:
+        event_id = await claim_event(session)
+        await process_event(session, event_id)
+
+async def _replay(*event_ids, failed=False):
+    async with AsyncSessionLocal() as session:
+        return await replay_events(session, event_ids, failed)
+
+async def _failing_handler(db, payment_intent):
+    raise RuntimeError("downstream unavailable")
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def test_redelivered_event_is_recorded_and_applied_once(client, db):
+    user = make_user(db, "buyer")
+    order = make_order(db, user, make_products(db, 1))
+    
+    for _ in range(2):
+        response = _deliver(client, "evt_paid", "payment_intent.succeeded", order.stripe_payment_intent_id)
+        assert response.status_code == 200, response.text
+    
+    assert db.query(WebhookEvent).count() == 1
+    assert asyncio.run(process_due_events()) == 1
+    assert asyncio.run(process_due_events()) == 0
+    db.expire_all()
+    assert db.get(Order, order.id).payment_status == "completed"
+    assert _event(db, "evt_paid").status == WebhookEventStatus.PROCESSED
+
+def test_bad_signature_is_rejected(client, db):
+    payload, headers = _signed("evt_forged", "payment_intent.succeeded", "pi_forged")
+    headers["stripe-signature"] = headers["stripe-signature"][:-1] + "0"
+    
+    response = client.post("/api/webhooks/stripe", content=payload, headers=headers)
+    
+    assert response.status_code == 400
+    assert db.query(WebhookEvent).count() == 0
+
+def test_failed_event_backs_off_then_fails_permanently(client, db, monkeypatch):
+    monkeypatch.setitem(webhook_worker.HANDLERS, "payment_intent.succeeded", _failing_handler)
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_MAX_ATTEMPTS", 2)
+    assert _deliver(client, "evt_retry", "payment_intent.succeeded", "pi_retry").status_code == 200
+    
+    before = datetime.now(timezone.utc)
+    asyncio.run(_process_one())
+    event = _event(db, "evt_retry")
+    assert event.status == WebhookEventStatus.PENDING
+    assert event.attempts == 1
+    assert "downstream unavailable" in event.last_error
+    assert _utc(event.next_attempt_at) - before >= retry_delay(1)
+    # Not due again until the backoff has passed
+    assert asyncio.run(_claim()) is None
+    
+    _make_due(db, "evt_retry")
+    asyncio.run(_process_one())
+    event = _event(db, "evt_retry")
+    assert event.status == WebhookEventStatus.FAILED
+    assert event.attempts == 2
+    assert asyncio.run(_claim()) is None
+
+def test_expired_lease_is_claimed_again(client, db):
+    assert _deliver(client, "evt_lease", "payment_intent.succeeded", "pi_lease").status_code == 200
+    
+    event_id = asyncio.run(_claim())
+    assert event_id == _event(db, "evt_lease").id
+    # Leased to the first worker, which has not finished with it
+    assert asyncio.run(_claim()) is None
+    
+    # The first worker died: once its lease runs out the event is due again
+    _make_due(db, "evt_lease")
+    assert asyncio.run(_claim()) == event_id
+    assert _event(db, "evt_lease").attempts == 2
+
+def test_replay_requeues_by_id_and_failed(client, db, monkeypatch):
+    user = make_user(db, "buyer")
+    order = make_order(db, user, make_products(db, 1))
+    assert _deliver(client, "evt_done", "payment_intent.payment_failed", "pi_unknown").status_code == 200
+    assert _deliver(client, "evt_stuck", "payment_intent.succeeded", order.stripe_payment_intent_id).status_code == 200
+    
+    with monkeypatch.context() as patch:
+        patch.setitem(webhook_worker.HANDLERS, "payment_intent.succeeded", _failing_handler)
+        patch.setattr(webhook_worker, "WEBHOOK_MAX_ATTEMPTS", 1)
+        assert asyncio.run(process_due_events()) == 2
+    assert _event(db, "evt_done").status == WebhookEventStatus.PROCESSED
+    assert _event(db, "evt_stuck").status == WebhookEventStatus.FAILED
+    
+    assert asyncio.run(_replay(failed=True)) == 1
+    assert asyncio.run(_replay("evt_done")) == 1
+    for event_id in ("evt_done", "evt_stuck"):
+        event = _event(db, event_id)
+        assert (event.status, event.attempts, event.processed_at) == (WebhookEventStatus.PENDING, 0, None)
+    
+    assert asyncio.run(process_due_events()) == 2
+    assert _event(db, "evt_stuck").status == WebhookEventStatus.PROCESSED
+    db.expire_all()
+    assert db.get(Order, order.id).payment_status == "completed"
@@ -0,0 +1,45 @@
+from models import WishlistItem
+from support import auth_headers, make_products, make_user
+
+def test_adding_twice_keeps_one_item(client, db):
+    product = make_products(db, 1)[0]
+    user = make_user(db, "shopper")
+    headers = auth_headers(user)
+    
+    first = client.post("/api/wishlist/", headers=headers, json={"product_id": product.id})
+    again = client.post("/api/wishlist/", headers=headers, json={"product_id": product.id})
+    assert first.status_code == again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    assert db.query(WishlistItem).filter(WishlistItem.user_id == user.id).count() == 1
+    assert [item["product"]["id"] for item in client.get("/api/wishlist/", headers=headers).json()] == [product.id]
+    
+    assert client.delete(f"/api/wishlist/{product.id}", headers=headers).status_code == 200
+    assert client.delete(f"/api/wishlist/{product.id}", headers=headers).status_code == 404
+
+def test_inactive_products_cannot_be_added(client, db):
+    product = make_products(db, 1)[0]
+    product.is_active = False
+    db.commit()
+    
+    response = client.post("/api/wishlist/", headers=auth_headers(make_user(db, "shopper")), json={"product_id": product.id})
+    assert response.status_code == 404
+
+def test_contains_answers_for_a_page_of_ids(client, db):
+    products = make_products(db, 4)
+    headers = auth_headers(make_user(db, "shopper"))
+    other = auth_headers(make_user(db, "other"))
+    for product in (products[3], products[1]):
+        client.post("/api/wishlist/", headers=headers, json={"product_id": product.id})
+    client.post("/api/wishlist/", headers=other, json={"product_id": products[0].id})
+    
+    ids = [product.id for product in products] + [products[-1].id + 100]
+    response = client.get("/api/wishlist/contains", headers=headers, params={"product_ids": ids})
+    assert response.json() == {"product_ids": [products[1].id, products[3].id]}
+
+def test_contains_caps_the_ids_per_lookup(client, db):
+    headers = auth_headers(make_user(db, "shopper"))
+    
+    assert client.get("/api/wishlist/contains", headers=headers, params={"product_ids": list(range(1, 101))}).status_code == 200
+    response = client.get("/api/wishlist/contains", headers=headers, params={"product_ids": list(range(1, 102))})
+    assert response.status_code == 400
+    assert response.json()["message"] == "At most 100 product ids per lookup"
@@ -0,0 +1,220 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+import argparse
+import asyncio
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, upsert
+from models import Order, WebhookEvent, WebhookEventStatus
+from rollups import record_payment_completed, record_payment_reversed
+from purchases import record_purchases
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Webhook requests only record the event; a pool of background workers applies
+# it. A claimed event is leased for WEBHOOK_LEASE_SECONDS, so one whose worker
+# died is retried; failures back off exponentially until WEBHOOK_MAX_ATTEMPTS.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = int(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "10"))
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+
+# Set when an event is recorded so an idle worker picks it up at once
+event_recorded = asyncio.Event()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next try of an event that has failed ``attempts`` times."""
+    return timedelta(seconds=WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+async def _find_order(db: AsyncSession, payment_intent: Dict[str, Any]) -> Optional[Order]:
+    order = await db.scalar(
+        select(Order)
+        .where(Order.stripe_payment_intent_id == payment_intent["id"])
+        .with_for_update()
+    )
+    if not order:
+        # Not retried: the intent was not created by this store
+        logger.error("Order not found for payment intent: %s", payment_intent['id'])
+    return order
+
+async def handle_payment_success(db: AsyncSession, payment_intent: Dict[str, Any]):
+    """Mark the intent's order paid and record it in the rollups and purchases."""
+    order = await _find_order(db, payment_intent)
+    if not order:
+        return
+    
+    # A replayed event must not count revenue twice
+    newly_paid = order.payment_status != "completed"
+    
+    order.payment_status = "completed"
+    order.status = "processing"
+    if newly_paid:
+        await record_payment_completed(db, order.id)
+        await record_purchases(db, order.id)
+    
+    logger.info("Payment successful for order %s", order.id)
+    
+    # TODO: Send confirmation email
+    # await send_order_confirmation_email(order)
+
+async def handle_payment_failure(db: AsyncSession, payment_intent: Dict[str, Any]):
+    """Mark the intent's order failed and cancelled."""
+    order = await _find_order(db, payment_intent)
+    if not order:
+        return
+    
+    # A payment counted as completed must come back out of the rollups
+    if order.payment_status == "completed":
+        await record_payment_reversed(db, order.id)
+    
+    order.payment_status = "failed"
+    order.status = "cancelled"
+    
+    logger.info("Payment failed for order %s", order.id)
+    
+    # TODO: Send failure notification email
+    # await send_payment_failure_email(order)
+
+# Event type -> handler applied to the event's data.object. Handlers must not
+# commit: the worker commits their changes together with the event's status.
+HANDLERS: Dict[str, Callable[[AsyncSession, Dict[str, Any]], Awaitable]] = {
+    "payment_intent.succeeded": handle_payment_success,
+    "payment_intent.payment_failed": handle_payment_failure,
+}
+
+async def record_event(db: AsyncSession, event: Dict[str, Any], payload: str) -> bool:
+    """Store a verified Stripe event for processing; False if it was already stored."""
+    result = await db.execute(
+        upsert(db, WebhookEvent)
+        .values(
+            stripe_event_id=event["id"],
+            event_type=event["type"],
+            payload=payload,
+            status=WebhookEventStatus.PENDING,
+            attempts=0,
+            next_attempt_at=_now()
+        )
+        .on_conflict_do_nothing(index_elements=["stripe_event_id"])
+    )
+    await db.commit()
+    recorded = result.rowcount > 0
+    if recorded:
+        event_recorded.set()
+    return recorded
+
+async def claim_event(db: AsyncSession) -> Optional[int]:
+    """Lease the next due event to this worker and return its id, if any."""
+    while True:
+        now = _now()
+        event = (await db.execute(
+            select(WebhookEvent.id, WebhookEvent.attempts)
+            .where(WebhookEvent.status == WebhookEventStatus.PENDING, WebhookEvent.next_attempt_at <= now)
+            .order_by(WebhookEvent.next_attempt_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).first()
+        if event is None:
+            await db.commit()
+            return None
+        
+        # Guarded on attempts, so two workers without row locks (SQLite)
+        # cannot both claim the same event
+        claimed = await db.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id == event.id, WebhookEvent.attempts == event.attempts)
+            .values(attempts=event.attempts + 1, next_attempt_at=now + timedelta(seconds=WEBHOOK_LEASE_SECONDS))
+        )
+        await db.commit()
+        if claimed.rowcount:
+            return event.id
+
+async def process_event(db: AsyncSession, event_id: int):
+    """Apply a claimed event, or schedule its retry if the handler fails."""
+    event = await db.get(WebhookEvent, event_id)
+    try:
+        data = json.loads(event.payload)
+        handler = HANDLERS.get(event.event_type)
+        if handler is None:
+            logger.info("Unhandled event type: %s", event.event_type)
+        else:
+            await handler(db, data["data"]["object"])
+        event.status = WebhookEventStatus.PROCESSED
+        event.processed_at = _now()
+        event.last_error = None
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        event = await db.get(WebhookEvent, event_id)
+        event.last_error = repr(e)
+        if event.attempts >= WEBHOOK_MAX_ATTEMPTS:
+            event.status = WebhookEventStatus.FAILED
+            logger.error("Webhook event %s failed permanently: %s", event.stripe_event_id, e)
+        else:
+            event.next_attempt_at = _now() + retry_delay(event.attempts)
+            logger.warning(
+                "Webhook event %s failed (attempt %s), will retry: %s", event.stripe_event_id, event.attempts, e
+            )
+        await db.commit()
+
+async def process_due_events() -> int:
+    """Process due events until none are left; the job each worker runs."""
+    processed = 0
+    async with AsyncSessionLocal() as db:
+        while (event_id := await claim_event(db)) is not None:
+            await process_event(db, event_id)
+            processed += 1
+    return processed
+
+async def replay_events(db: AsyncSession, stripe_event_ids: Sequence[str] = (), failed: bool = False) -> int:
+    """Queue events again, by Stripe event id and/or every failed event."""
+    conditions = []
+    if stripe_event_ids:
+        conditions.append(WebhookEvent.stripe_event_id.in_(list(stripe_event_ids)))
+    if failed:
+        conditions.append(WebhookEvent.status == WebhookEventStatus.FAILED)
+    if not conditions:
+        return 0
+    
+    result = await db.execute(
+        update(WebhookEvent)
+        .where(or_(*conditions))
+        .values(
+            status=WebhookEventStatus.PENDING,
+            attempts=0,
+            next_attempt_at=_now(),
+            processed_at=None
+        )
+    )
+    await db.commit()
+    if result.rowcount:
+        event_recorded.set()
+    return result.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Stripe webhook events.")
+    parser.add_argument("event_ids", nargs="*", help="Stripe event ids (evt_...) to process again")
+    parser.add_argument("--failed", action="store_true", help="Replay every event that exhausted its retries")
+    parser.add_argument("--now", action="store_true", help="Process the replayed events here instead of leaving them to the workers")
+    args = parser.parse_args()
+    if not args.event_ids and not args.failed:
+        parser.error("give event ids or --failed")
+    
+    async def main():
+        async with AsyncSessionLocal() as db:
+            replayed = await replay_events(db, args.event_ids, args.failed)
+        print(f"Queued {replayed} events")
+        if args.now:
+            print(f"Processed {await process_due_events()} events")
+    
+    asyncio.run(main())
@@ -163,7 +163,7 @@ export const AdminProducts: React.FC = () => {
     }
   }
 
-  const filteredProducts = products?.data?.filter((product: Product) =>
+  const filteredProducts = products?.data?.items?.filter((product: Product) =>
     product.name.toLowerCase().includes(search.toLowerCase()) ||
     product.description.toLowerCase().includes(search.toLowerCase())
   ) || []
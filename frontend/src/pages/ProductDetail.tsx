@@ -94,7 +94,8 @@ export const ProductDetail: React.FC = () => {
   }
 
   const productData = product.data
-  const averageRating = reviews?.data?.reduce((acc: number, review: any) => acc + review.rating, 0) / (reviews?.data?.length || 1) || 0
+  const averageRating = productData.rating_average || 0
+  const reviewItems = reviews?.data?.items || []
 
   return (
     <div className="container mx-auto px-4 py-8">
@@ -136,7 +137,7 @@ export const ProductDetail: React.FC = () => {
               <Star className="h-5 w-5 fill-yellow-400 text-yellow-400 mr-1" />
               <span className="text-lg font-semibold">{averageRating.toFixed(1)}</span>
               <span className="text-muted-foreground ml-2">
-                ({reviews?.data?.length || 0} reviews)
+                ({productData.reviews_count || 0} reviews)
               </span>
             </div>
             <Button variant="outline" size="icon">
@@ -220,11 +221,11 @@ export const ProductDetail: React.FC = () => {
       </div>
 
       {/* Reviews Section */}
-      {reviews?.data && reviews.data.length > 0 && (
+      {reviewItems.length > 0 && (
         <div className="mt-12">
           <h2 className="text-2xl font-bold mb-6">Customer Reviews</h2>
           <div className="space-y-4">
-            {reviews.data.map((review: any) => (
+            {reviewItems.map((review: any) => (
               <Card key={review.id}>
                 <CardContent className="pt-6">
                   <div className="flex items-center justify-between mb-2">